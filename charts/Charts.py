@@ -1,12 +1,33 @@
+import contextvars
+import hashlib
 import math
-from django.utils.html import format_html
+import mmap
+from array import array
+from itertools import islice
+
+from django.utils.safestring import mark_safe
+
+from charts import instrumentation, stats
+from charts.binning import BinCounter
+from charts.cache import get_default_cache
+from charts.columns import compact_column, concatenate_columns, normalize_column
+from charts.downsampling import LTTB, METHODS, MIN_MAX
+from charts.executors import get_default_executor, is_process_executor
+from charts.sketches import DEFAULT_K, merge_sketches, sketch_column
+from charts.computation import (DEFAULT_MAX_BREAKS, DEFAULT_MAX_Y, GROUPED, LINEAR, LOG, OVERLAID, SCALES, STACKED,
+                                compute_histogram, compute_series, get_bins_edges, get_histogram_bins)
+from charts.lazy import LazyModule
+from charts.svg import SVG_NAMESPACE, SvgWriter
+
+# the Django ORM is only imported by charts of a queryset
+querysets = LazyModule('charts.querysets')
 
 
 class Chart(object):
     """
     Main Object for django simple charts
     """
-    columns = []
+    columns = ()
     data_dictionary = None
     x_label = 'X'
     y_label = 'Y'
@@ -22,12 +43,22 @@ class Chart(object):
     max_y = None
 
     svg_width = 400
+    precision = 2
+    colors = ('#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd', '#8c564b', '#e377c2', '#7f7f7f')
+
+    render_cache = None
+    data_version = None
+
+    # attributes changing the output, they are part of the chart fingerprint
+    _settings_attributes = ('columns', 'x_label', 'y_label', 'axis', 'x_step', 'y_step', 'x_number_step',
+                            'y_number_step', 'min_x_value', 'max_x_value', 'min_y', 'max_y', 'svg_width', 'precision',
+                            'colors')
 
     def __init__(self):
-        pass
+        self.columns = list()
 
     def set_columns(self, columns):
-        self.columns = columns
+        self.columns = list(columns)
         return self
 
     def set_x_label(self, x_label):
@@ -74,6 +105,166 @@ class Chart(object):
         self.max_y = max_y
         return self
 
+    def set_colors(self, colors):
+        """
+        Set fill colors of the columns series, used in turn
+        :param colors:
+        :return:
+        """
+        self.colors = tuple(colors)
+        return self
+
+    def set_precision(self, precision):
+        """
+        Set number of decimals of SVG coordinates
+        :param precision:
+        :return:
+        """
+        self.precision = precision
+        return self
+
+    def set_render_cache(self, render_cache=True):
+        """
+        Cache rendered markup by chart fingerprint
+        :param render_cache: cache.RenderCache, True for the default cache or None to disable caching
+        :return:
+        """
+        if render_cache is True:
+            render_cache = get_default_cache()
+        self.render_cache = render_cache or None
+        return self
+
+    def set_data_version(self, data_version):
+        """
+        Identify chart data by a version in fingerprints instead of hashing it (ie. an updated_at timestamp or a
+        table version), the caller changes the version when any data changes (columns, streamed values, sketches
+        or queryset rows)
+        :param data_version: hashable value with a stable repr, None to hash the data
+        :return:
+        """
+        self.data_version = data_version
+        return self
+
+    def _iter_data_fingerprint(self):
+        """
+        Yield bytes identifying chart data
+        :return:
+        """
+        return iter(())
+
+    def fingerprint(self):
+        """
+        Get a hash of chart class, settings and data
+        :return: hex digest
+        """
+        digest = hashlib.blake2b(digest_size=16)
+        settings = [(x, getattr(self, x)) for x in self._settings_attributes]
+        digest.update(repr((self.__class__.__name__, settings)).encode())
+        if self.data_version is not None:
+            digest.update(repr(('data_version', self.data_version)).encode())
+        else:
+            for chunk in self._iter_data_fingerprint():
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def has_live_data(self):
+        """
+        Check if data is read at render time (ie. from a database table), the chart may change without its
+        fingerprint changing
+        :return:
+        """
+        return False
+
+    def svg_size(self):
+        """
+        Get width and height of the <svg> Tag, known without computing the chart
+        :return: (width, height)
+        """
+        return self.svg_width + 100, (self.max_y or DEFAULT_MAX_Y) + 50
+
+    def compute(self, profile=None):
+        """
+        Compute the chart result from data and settings, without changing the chart
+        :param profile: instrumentation.ChartProfile recording phases timings, if any
+        :return:
+        """
+        raise NotImplementedError
+
+    def iter_svg(self, result=None):
+        """
+        Yield <svg> Tag fragments of a computed result
+        :param result: computed result to render, computed from data when missing
+        :return:
+        """
+        raise NotImplementedError
+
+    def html_svg(self, result=None):
+        """
+        Create HTML <svg> Tag Output for SVG Image.
+        :param result: computed result to render, computed from data (or taken from the render cache) when missing
+        :return:
+        """
+        profile = instrumentation.start_profile(self)
+        if result is None:
+            markup = self._cached(lambda: self._join_svg(self.compute(profile), profile))
+        else:
+            markup = self._join_svg(result, profile)
+        instrumentation.finish_profile(profile, self, markup)
+        return markup
+
+    async def ahtml_svg(self, result=None, executor=None):
+        """
+        Create HTML <svg> Tag Output in an executor, without blocking the event loop.
+        With a process pool the chart is pickled (without its render cache) and rendered by a worker, the render
+        cache is used in this process, in the event loop default executor.
+        :param result: computed result to render, computed from data (or taken from the render cache) when missing
+        :param executor: concurrent.futures executor, None for executors.get_default_executor()
+        :return:
+        """
+        import asyncio
+        if executor is None:
+            executor = get_default_executor()
+        loop = asyncio.get_running_loop()
+        # the context is copied so profiles are collected for the current request
+        render = contextvars.copy_context().run
+        if not is_process_executor(executor):
+            return await loop.run_in_executor(executor, render, self.html_svg, result)
+        if result is not None or self.render_cache is None:
+            return mark_safe(await loop.run_in_executor(executor, self.html_svg, result))
+        # fingerprints hash the data and the cache may be a network backend, both stay off the event loop
+        key = await loop.run_in_executor(None, self.render_cache.get_key, self)
+        markup = await loop.run_in_executor(None, self.render_cache.get, self, key)
+        if markup is None:
+            markup = mark_safe(await loop.run_in_executor(executor, self.html_svg, result))
+            await loop.run_in_executor(None, self.render_cache.set, self, markup, key)
+        return markup
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # the render cache holds locks and belongs to the process
+        state.pop('render_cache', None)
+        return state
+
+    def _join_svg(self, result, profile=None):
+        """
+        Join <svg> Tag fragments of a computed result as safe markup
+        :param result:
+        :param profile:
+        :return:
+        """
+        with instrumentation.phase(profile, instrumentation.RENDERING):
+            return mark_safe(''.join(self.iter_svg(result)))
+
+    def _cached(self, render):
+        """
+        Get markup from the render cache if enabled
+        :param render: callable returning the markup
+        :return:
+        """
+        if self.render_cache is None:
+            return render()
+        return self.render_cache.get_or_render(self, render)
+
     @staticmethod
     def _check_has_attr(obj, attr_list):
         """
@@ -99,6 +290,38 @@ class Chart(object):
 
 class QuantitativeChart(Chart):
 
+    def __init__(self):
+        super().__init__()
+        self._summaries = dict()
+        self._bounds = dict()
+        self._columns_data = dict()
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        # normalized columns may be memory views, they are normalized again from data and summaries keep them
+        state['_columns_data'] = dict()
+        state['_summaries'] = dict()
+        state['_bounds'] = dict()
+        state['data_dictionary'] = self._get_picklable_data(self.data_dictionary)
+        return state
+
+    @staticmethod
+    def _get_picklable_data(data_dictionary):
+        """
+        Copy memory views and mapped files of a data dictionary into arrays of doubles, they can not be pickled
+        :param data_dictionary:
+        :return: copy of the data dictionary
+        """
+        if not isinstance(data_dictionary, dict):
+            return data_dictionary
+        copied = dict()
+        for column, options in data_dictionary.items():
+            data = options.get('data') if isinstance(options, dict) else None
+            if isinstance(data, (memoryview, mmap.mmap)):
+                options = dict(options, data=compact_column(normalize_column(data)))
+            copied[column] = options
+        return copied
+
     @staticmethod
     def _try_get_nested_value_from_dictionary(dictionary, *ordered_keys):
         """
@@ -112,24 +335,126 @@ class QuantitativeChart(Chart):
             try:
                 for key in ordered_keys:
                     value = value[key]
-            except KeyError:
+            except (KeyError, TypeError):
                 value = None
             return value
 
+    def _get_column_data(self, column):
+        """
+        Get data of a column normalized by columns.normalize_column, None for a missing column.
+        The same data object is normalized once (iterators are consumed), replaced data is normalized again.
+        :param column:
+        :return:
+        """
+        data = self._try_get_nested_value_from_dictionary(self.data_dictionary, column, 'data')
+        entry = self._columns_data.get(column)
+        if entry is None or entry[0] is not data:
+            entry = (data, normalize_column(data))
+            self._columns_data[column] = entry
+        return entry[1]
+
+    @staticmethod
+    def _get_data_bytes(data):
+        """
+        Get bytes representation of column data for fingerprints
+        :param data:
+        :return:
+        """
+        if data is None:
+            return b''
+        try:
+            return memoryview(data).tobytes()
+        except TypeError:
+            pass
+        try:
+            return array('d', data).tobytes()
+        except TypeError:
+            return repr(list(data)).encode()
+
+    def _iter_data_fingerprint(self):
+        for column in self.columns:
+            data = self._get_column_data(column)
+            yield repr(column).encode()
+            yield self._get_data_bytes(data)
+
+    def _get_summary_version(self, column):
+        """
+        Get what the summary of a column is computed from
+        :param column:
+        :return: (objects compared by identity, values compared by equality)
+        """
+        data = self._get_column_data(column)
+        return (data,), (len(data) if data is not None else 0,)
+
+    def _get_cached_summary(self, key, versions, describe, cache=None):
+        """
+        Get a cached summary, described again when its objects are replaced or its values change
+        (ie. data appended to a list or another data dictionary)
+        :param key: column or tuple of columns
+        :param versions: list of _get_summary_version results
+        :param describe: callable returning the summary
+        :param cache: dictionary keeping the summaries, self._summaries when missing
+        :return:
+        """
+        cache = self._summaries if cache is None else cache
+        objects = tuple(x for version_objects, _ in versions for x in version_objects)
+        values = tuple(x for _, version_values in versions for x in version_values)
+        entry = cache.get(key)
+        if (entry is None or entry[1] != values or len(entry[0]) != len(objects) or
+                any(x is not y for x, y in zip(entry[0], objects))):
+            # objects are kept with the summary so their ids are not reused
+            entry = (objects, values, describe())
+            cache[key] = entry
+        return entry[2]
+
+    def _describe_column(self, column):
+        return stats.describe(self._get_column_data(column))
+
+    def _get_column_summary(self, column):
+        """
+        Get (cached) min, quartiles and max of a column
+        :param column:
+        :return: stats.Summary or None for a column without data
+        """
+        return self._get_cached_summary(column, [self._get_summary_version(column)],
+                                        lambda: self._describe_column(column))
+
+    def _describe_column_bounds(self, column):
+        return stats.bounds(self._get_column_data(column))
+
+    def _get_column_bounds(self, column):
+        """
+        Get (cached) min and max of a column, cheaper than its summary when quartiles are not needed
+        :param column:
+        :return: (min, max) or None for a column without data
+        """
+        return self._get_cached_summary(column, [self._get_summary_version(column)],
+                                        lambda: self._describe_column_bounds(column), self._bounds)
+
+    def _get_x_range(self):
+        """
+        Get (min, max) of the x axis from settings or columns data, without changing the chart
+        :return:
+        """
+        min_x_value, max_x_value = self.min_x_value, self.max_x_value
+        if min_x_value and max_x_value:
+            return min_x_value, max_x_value
+        columns_bounds = [self._get_column_bounds(x) for x in self.columns]
+        columns_bounds = [x for x in columns_bounds if x]
+        if columns_bounds:
+            if not min_x_value:
+                min_x_value = min(x[0] for x in columns_bounds)
+            if not max_x_value:
+                max_x_value = max(x[1] for x in columns_bounds)
+        return min_x_value, max_x_value
+
     def complete_quantitative_attrs(self):
         """
         Complete Attributes with None Value to default based queryset selected columns.
         :return: self histogram object
         """
-        if self.data_dictionary:
-            x_min_list = [min(self._try_get_nested_value_from_dictionary(self.data_dictionary, x, 'data')) for x in
-                          self.columns]
-            if not self.min_x_value:
-                self.min_x_value = min(x_min_list)
-            x_max_list = [max(self._try_get_nested_value_from_dictionary(self.data_dictionary, x, 'data')) for x in
-                          self.columns]
-            if not self.max_x_value:
-                self.max_x_value = max(x_max_list)
+        self.min_x_value, self.max_x_value = self._get_x_range()
+        return self
 
 
 class Histogram(QuantitativeChart):
@@ -139,155 +464,650 @@ class Histogram(QuantitativeChart):
     queryset = None
     breaks = None
     bins_width = None
-    _histogram_dictionary = dict()
+    edges = None
+    layout = OVERLAID
+    parallel = None
+    approximate = False
+    sketch_k = DEFAULT_K
+    scale = LINEAR
+    sparse = False
+    max_breaks = DEFAULT_MAX_BREAKS
+
+    OVERLAID = OVERLAID
+    STACKED = STACKED
+    GROUPED = GROUPED
+    LINEAR = LINEAR
+    LOG = LOG
+
+    _settings_attributes = Chart._settings_attributes + ('breaks', 'edges', 'layout', 'approximate', 'sketch_k',
+                                                         'scale', 'sparse', 'max_breaks')
+
+    # number of values binned at once by add_values
+    stream_chunk_size = 65536
 
-    def __init__(self, data_dictionary):
+    def __init__(self, data_dictionary=None):
         super().__init__()
         self.data_dictionary = data_dictionary
+        self.bin_counters = dict()
+        self.sketches = dict()
+        self._data_sketches = dict()
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        state['_data_sketches'] = dict()
+        if self.queryset is not None:
+            # pickling a queryset evaluates it, only its query is kept and it is rebuilt when unpickled
+            state['queryset'] = None
+            state['_pickled_queryset'] = (self.queryset.model, self.queryset.query)
+        return state
+
+    def __setstate__(self, state):
+        pickled_queryset = state.pop('_pickled_queryset', None)
+        if pickled_queryset is not None:
+            model, query = pickled_queryset
+            state['queryset'] = model._default_manager.all()
+            state['queryset'].query = query
+        self.__dict__.update(state)
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        """
+        Build a histogram from the stored edges, counts and summaries of a snapshot, without raw data
+        :param snapshot: models.ChartSnapshot
+        :return:
+        """
+        edges = snapshot.get_edges()
+        if len(edges) < 2:
+            raise ValueError('Snapshot %r has not been refreshed' % (snapshot.name,))
+        summaries = snapshot.get_summaries()
+        histogram = cls().set_columns(snapshot.get_columns()).set_edges(edges)
+        for column, counts in snapshot.get_counts().items():
+            counter = BinCounter(edges=edges)
+            counter.counts = counts
+            counter.total = sum(counts)
+            if summaries.get(column):
+                counter.min, counter.max = summaries[column].min, summaries[column].max
+            histogram.bin_counters[column] = counter
+        return histogram
+
+    @classmethod
+    def from_sketches(cls, sketches):
+        """
+        Build an approximate histogram from quantile sketches, without raw data
+        :param sketches: dictionary of column to sketches.KLLSketch or list of sketches (ie. of partitions) to merge
+        :return:
+        """
+        histogram = cls().set_columns(sketches)
+        for column, column_sketches in sketches.items():
+            if not isinstance(column_sketches, (list, tuple)):
+                column_sketches = [column_sketches]
+            for sketch in column_sketches:
+                histogram.add_sketch(column, sketch)
+        return histogram
 
     def set_breaks(self, breaks):
         self.breaks = breaks
         return self
 
-    @staticmethod
-    def _get_quantile(data, r):
+    def set_max_breaks(self, max_breaks):
         """
-        Get Quantile for r proportion (ie. 0.25 for Q1 and 0.5 for median)
-        :param data:
-        :param r:
+        Set the maximum number of bins derived from the Freedman-Diaconis width, above it adjacent bins are merged
+        by a whole factor. Breaks given by set_breaks() are kept.
+        :param max_breaks: None for no limit
         :return:
         """
-        if data:
-            size = data.__len__()
-            return data[math.floor(size * r)]
+        self.max_breaks = max_breaks
+        return self
 
-    def _get_interquartile_range(self, data):
+    def set_scale(self, scale):
         """
-        Get Interquantile Range (Q3 - Q1)
-        :param data:
+        Set scale of the x axis, LOG bins have the same width in log scale (for heavy-tailed positive data)
+        :param scale: Histogram.LINEAR or Histogram.LOG
         :return:
         """
-        if data:
-            return self._get_quantile(data, 0.75) - self._get_quantile(data, 0.25)
+        if scale not in SCALES:
+            raise ValueError('Unknown histogram scale: %r' % (scale,))
+        self.scale = scale
+        return self
 
-    def _get_default_histogram_width(self, data):
+    def set_sparse(self, sparse=True):
         """
-        Get Default histogram withs
-        :param data:
+        Keep only occupied bins: counts, memory and output scale with occupied bins, empty bins are not drawn
+        :param sparse:
         :return:
         """
-        if data:
-            return 2 * self._get_interquartile_range(data) / (data.__len__() ** (1 / 3))
+        self.sparse = sparse
+        return self
 
-    def _get_aggregated_data(self):
+    def set_layout(self, layout):
         """
-        Aggregate all columns data in one list
+        Set layout of multi-column histograms
+        :param layout: Histogram.OVERLAID, Histogram.STACKED or Histogram.GROUPED
         :return:
         """
-        if self.data_dictionary:
-            raw_list = [self._try_get_nested_value_from_dictionary(self.data_dictionary, x, 'data') for x in
-                        self.columns]
-            return [y for x in raw_list for y in x]
+        self.layout = layout
+        return self
 
-    @staticmethod
-    def _count_data_in_range(data, min, max):
+    def set_parallel(self, parallel=True):
         """
-        Count Number of data on a specific range for a list
-        :param data:
-        :param min:
-        :param max:
+        Bin columns in a process pool (see charts.parallel), counts are the same as serial binning
+        :param parallel: True, False or None to bin in parallel above parallel.threshold values
         :return:
         """
-        return [x for x in data if min <= x < max].__len__()
+        self.parallel = parallel
+        return self
 
-    def _get_histogram_dictionary_for_column(self, column):
+    def set_approximate(self, approximate=True, k=DEFAULT_K):
+        """
+        Take min, quartiles and max of columns data from quantile sketches built in one pass (see charts.sketches),
+        quartiles and the Freedman-Diaconis width are approximate, counts are exact
+        :param approximate:
+        :param k: sketches size, the rank error shrinks as 1 / k
+        :return:
         """
-        Get list of dictionaries (one list for each bin)
+        self.approximate = approximate
+        self.sketch_k = k
+        return self
+
+    def add_sketch(self, column, sketch):
+        """
+        Merge a quantile sketch of a column, counts of the column are approximated from the merged sketch
         :param column:
+        :param sketch: sketches.KLLSketch
         :return:
         """
-        histogram_column = list()
-        data = self._try_get_nested_value_from_dictionary(self.data_dictionary, column, 'data')
-        if data:
-            for bin_index in range(self.breaks):
-                min_bin = self.min_x_value + bin_index * self.bins_width
-                max_bin = min_bin + self.bins_width
-                histogram_column.append({'min': min_bin, 'max': max_bin,
-                                         'count': self._count_data_in_range(data, min_bin, max_bin)})
+        if column in self.sketches:
+            self.sketches[column].merge(sketch)
+        else:
+            self.sketches[column] = sketch.copy()
+        return self
+
+    def set_queryset(self, queryset):
+        """
+        Set queryset to aggregate in the database, columns missing from data dictionary are its field names
+        :param queryset:
+        :return:
+        """
+        self.queryset = queryset
+        return self
+
+    def set_edges(self, edges):
+        """
+        Set sorted bins edges for non-uniform bins (n + 1 edges for n bins)
+        :param edges:
+        :return:
+        """
+        self.edges = list(edges)
+        return self
+
+    def _is_queryset_column(self, column):
+        """
+        Check if a column is aggregated from the queryset
+        :param column:
+        :return:
+        """
+        return (self.queryset is not None and column not in self.bin_counters and column not in self.sketches and
+                self._get_column_data(column) is None)
+
+    def _get_column_sketch(self, column):
+        """
+        Get the added sketch of a column or, in approximate mode, the (cached) sketch of its data
+        :param column:
+        :return: sketches.KLLSketch or None
+        """
+        if column in self.sketches:
+            return self.sketches[column]
+        data = self._get_column_data(column)
+        if self.approximate and data is not None:
+            entry = self._data_sketches.get(column)
+            if entry is None or entry[0] is not data or entry[1] != (len(data), self.sketch_k):
+                entry = (data, (len(data), self.sketch_k), sketch_column(data, self.sketch_k))
+                self._data_sketches[column] = entry
+            return entry[2]
+
+    def _get_summary_version(self, column):
+        objects, values = super()._get_summary_version(column)
+        sketch = self.sketches.get(column)
+        queryset_version = querysets.version(self.queryset) if self._is_queryset_column(column) else None
+        # merging a sketch changes its count
+        return (objects + (self.queryset, sketch),
+                values + (self.approximate, self.sketch_k, sketch.count if sketch is not None else None,
+                          column in self.bin_counters, queryset_version))
 
-            return histogram_column
+    def _describe_column(self, column):
+        if self._is_queryset_column(column):
+            return querysets.describe(self.queryset, column)
+        if self._get_column_sketch(column) is not None:
+            return self._get_column_sketch(column).describe()
+        return super()._describe_column(column)
+
+    def _describe_column_bounds(self, column):
+        if self._is_queryset_column(column):
+            aggregated = querysets.bounds(self.queryset, column)
+            return aggregated[1:] if aggregated is not None else None
+        sketch = self._get_column_sketch(column)
+        if sketch is not None:
+            return (sketch.min, sketch.max) if sketch.count else None
+        return super()._describe_column_bounds(column)
+
+    def _get_x_range(self):
+        if self.edges:
+            # the axis spans the bins, data may be narrower than the edges
+            return (self.min_x_value if self.min_x_value is not None else self.edges[0],
+                    self.max_x_value if self.max_x_value is not None else self.edges[-1])
+        return super()._get_x_range()
+
+    def _get_bin_counter(self):
+        """
+        Get an empty counter for the fixed bins of the chart settings
+        :return:
+        """
+        if self.edges:
+            return BinCounter(edges=self.edges)
+        if None in (self.min_x_value, self.max_x_value) or not self.breaks:
+            raise ValueError('Streaming values needs set_edges() or set_min_x_value(), set_max_x_value() and '
+                             'set_breaks()')
+        # same bins as compute(), LOG bins are delimited by their edges
+        bins_width, bin_ranges = get_histogram_bins(self.min_x_value, self.max_x_value, self.breaks, scale=self.scale)
+        if bins_width is None:
+            return BinCounter(edges=get_bins_edges(bin_ranges))
+        return BinCounter(min_value=self.min_x_value, breaks=len(bin_ranges), width=bins_width)
+
+    def add_values(self, column, iterable):
+        """
+        Bin values of a column chunk by chunk, without keeping them.
+        Bins are fixed by the settings at the first call for the column.
+        :param column:
+        :param iterable: any iterable of numbers (ie. generator or queryset.iterator())
+        :return:
+        """
+        if column not in self.bin_counters:
+            self.bin_counters[column] = self._get_bin_counter()
+        counter = self.bin_counters[column]
+        iterator = iter(iterable)
+        chunk = list(islice(iterator, self.stream_chunk_size))
+        while chunk:
+            counter.update(chunk)
+            chunk = list(islice(iterator, self.stream_chunk_size))
+        return self
+
+    def _iter_data_fingerprint(self):
+        yield from super()._iter_data_fingerprint()
+        for column, counter in sorted(self.bin_counters.items()):
+            yield repr((column, counter.bin_ranges, counter.counts)).encode()
+        for column, sketch in sorted(self.sketches.items()):
+            yield repr(column).encode()
+            yield sketch.to_bytes()
+        if self.queryset is not None:
+            yield str(self.queryset.query).encode()
+            # added or deleted rows change the fingerprint
+            yield repr(querysets.version(self.queryset)).encode()
+
+    def has_live_data(self):
+        return self.queryset is not None
+
+    def _get_aggregated_data(self):
+        """
+        Aggregate all columns data in one compact array
+        :return:
+        """
+        raw_list = [self._get_column_data(x) for x in self.columns]
+        raw_list = [x for x in raw_list if x is not None]
+        if raw_list:
+            return concatenate_columns(raw_list)
+
+    def _get_aggregated_summary(self):
+        """
+        Get (cached) min, quartiles and max of all columns data together
+        :return:
+        """
+        if len(self.columns) == 1:
+            return self._get_column_summary(self.columns[0])
+        return self._get_cached_summary(tuple(self.columns), [self._get_summary_version(x) for x in self.columns],
+                                        self._describe_aggregated_data)
+
+    def _sketch_column(self, column):
+        """
+        Build the sketch of a column without one, from its data or its queryset values
+        :param column:
+        :return: sketches.KLLSketch or None for a column without values (ie. only binned by add_values)
+        """
+        if self._is_queryset_column(column):
+            return sketch_column(querysets.iter_values(self.queryset, column), self.sketch_k)
+        data = self._get_column_data(column)
+        if data is not None:
+            return sketch_column(data, self.sketch_k)
+
+    def _describe_aggregated_data(self):
+        column_sketches = [self._get_column_sketch(x) for x in self.columns]
+        queryset_columns = [x for x in self.columns if self._is_queryset_column(x)]
+        if len(queryset_columns) == len(self.columns):
+            return querysets.describe(self.queryset, self.columns)
+        if queryset_columns or any(x is not None for x in column_sketches):
+            # every column is part of the merged sketch, not only the sketched ones: quartiles of queryset
+            # columns mixed with data columns are approximated without fetching every row
+            column_sketches = [x if x is not None else self._sketch_column(column)
+                               for column, x in zip(self.columns, column_sketches)]
+            return merge_sketches([x for x in column_sketches if x is not None]).describe()
+        return stats.describe(self._get_aggregated_data())
+
+    def compute(self, profile=None):
+        """
+        Compute bins, counts and scales from data and settings, without changing the chart
+        :param profile: instrumentation.ChartProfile recording phases timings, if any
+        :return: computation.HistogramResult
+        """
+        with instrumentation.phase(profile, instrumentation.ATTRIBUTES):
+            min_x_value, max_x_value = self._get_x_range()
+            aggregated_summary = None
+            if not self.edges and not self.breaks:
+                aggregated_summary = self._get_aggregated_summary()
+            columns_data = [(x, self._get_column_data(x)) for x in self.columns]
+        binned_counts = {x: counter.counts for x, counter in self.bin_counters.items()}
+        queryset_columns = [x for x in self.columns if self._is_queryset_column(x)]
+        sketch_columns = [x for x in self.columns if x in self.sketches and x not in binned_counts]
+        with instrumentation.phase(profile, instrumentation.BINNING):
+            if queryset_columns or sketch_columns:
+                bins_width, bin_ranges = get_histogram_bins(min_x_value, max_x_value, self.breaks, self.edges,
+                                                            aggregated_summary, self.scale, self.max_breaks)
+                bins_edges = self.edges or (get_bins_edges(bin_ranges) if bins_width is None else None)
+            for column in sketch_columns:
+                if bins_edges:
+                    binned_counts[column] = self.sketches[column].count_edges(bins_edges)
+                else:
+                    binned_counts[column] = self.sketches[column].count_uniform(min_x_value, bins_width,
+                                                                                len(bin_ranges))
+            for column in queryset_columns:
+                if bins_edges:
+                    binned_counts[column] = querysets.count_edges(self.queryset, column, bins_edges)
+                else:
+                    binned_counts[column] = querysets.count_uniform(self.queryset, column, min_x_value, bins_width,
+                                                                    len(bin_ranges))
+        return compute_histogram(columns_data, min_x_value, max_x_value, breaks=self.breaks, edges=self.edges,
+                                 max_y=self.max_y, svg_width=self.svg_width, aggregated_summary=aggregated_summary,
+                                 binned_counts=binned_counts, layout=self.layout, profile=profile,
+                                 binned_ranges={x: counter.bin_ranges for x, counter in self.bin_counters.items()},
+                                 parallel_binning=self.parallel, scale=self.scale, sparse=self.sparse,
+                                 max_breaks=self.max_breaks)
 
     def complete_histogram_attrs(self):
         """
         Complete histogram specific attributes
+        :return: computed result
+        """
+        result = self.compute()
+        self.breaks = result.breaks
+        self.bins_width = result.bins_width
+        self.min_y = result.min_y
+        self.max_y = result.max_y
+        return result
+
+    def _iter_bin_rects(self, result, min_bin_x_value, max_bin_x_value, counts):
+        """
+        Yield (x, width, y, height, color) of the rect of every column in a bin
+        :param result:
+        :param min_bin_x_value:
+        :param max_bin_x_value:
+        :param counts: bin count of every column
         :return:
         """
-        range_of_data = self.max_x_value - self.min_x_value
+        x = result.x_position(min_bin_x_value)
+        width = result.x_length(min_bin_x_value, max_bin_x_value)
+        if result.layout == GROUPED:
+            width = width / len(counts)
+        bottom = result.max_y
+        for index, count in enumerate(counts):
+            color = self.colors[index % len(self.colors)] if len(counts) > 1 else None
+            height = result.y_scale * count
+            if result.layout == STACKED:
+                bottom -= height
+                yield x, width, bottom, height, color
+            elif result.layout == GROUPED:
+                yield x + index * width, width, bottom - height, height, color
+            else:
+                yield x, width, bottom - height, height, color
 
-        if not self.breaks:
-            aggregated_data = self._get_aggregated_data()
-            if self._get_default_histogram_width(aggregated_data):
-                self.bins_width = self._get_default_histogram_width(aggregated_data)
-                self.breaks = math.ceil(range_of_data / self.bins_width)
-        else:
-            self.bins_width = math.ceil(range_of_data / self.breaks)
+    def iter_svg(self, result=None):
+        """
+        Yield <svg> Tag fragments: header and axes, one <g> for each bin (with a rect for each column), footer
+        :param result: computed result to render, computed from data when missing
+        :return:
+        """
+        if result is None:
+            result = self.compute()
+        writer = SvgWriter(self.precision)
+        writer.start('svg', xmlns=SVG_NAMESPACE, width=result.svg_width + 100, height=result.max_y + 50,
+                     aria_labelledby='title desc', role='img')
+        if self.axis:
+            axis_length = result.max_x_value * result.x_scale if result.scale == LINEAR else result.x_position(
+                result.max_x_value)
+            writer.element('line', x1=0, y1=result.max_y, x2=axis_length, y2=result.max_y,
+                           stroke='#000', stroke_width=2)
+            writer.element('line', x1=0, y1=result.max_y, x2=0, y2=0, stroke='#000', stroke_width=2)
+        yield writer.flush()
+        x_labels_height = 405
+        overlaid = result.layout == OVERLAID and len(result.columns) > 1
+        for min_bin_x_value, max_bin_x_value, counts in result.iter_bins():
+            bin_x_position = result.x_position(min_bin_x_value)
+            label_transform = 'rotate(90 %s %s)' % (writer.format_number(bin_x_position),
+                                                    writer.format_number(x_labels_height))
+            writer.start('g')
+            for x, width, y, height, color in self._iter_bin_rects(result, min_bin_x_value, max_bin_x_value, counts):
+                writer.element('rect', width=width, height=height, x=x, y=y, fill=color,
+                               fill_opacity=0.5 if overlaid else None)
+            label = str(round(min_bin_x_value, 1)) if result.scale == LINEAR else '%.3g' % min_bin_x_value
+            writer.element('text', label, x=bin_x_position, y=x_labels_height,
+                           transform=label_transform)
+            writer.end('g')
+            yield writer.flush()
+        writer.end('svg')
+        yield writer.flush()
 
-        for column in self.columns:
-            self._histogram_dictionary[column] = self._get_histogram_dictionary_for_column(column)
 
-        self.min_y = 0
-        if not self.max_y:
-            self.max_y = 400
+class SeriesChart(QuantitativeChart):
+    """
+    Chart of columns of y values drawn against shared x values, with one <path> for each column. Columns with more
+    points than the svg_width are downsampled before they are drawn.
+    """
+    x_column = None
+    min_y_value = None
+    max_y_value = None
+    downsampling = LTTB
+    stroke_width = 1.5
 
-    def html_svg(self):
+    LTTB = LTTB
+    MIN_MAX = MIN_MAX
+
+    _settings_attributes = Chart._settings_attributes + ('x_column', 'min_y_value', 'max_y_value', 'downsampling',
+                                                         'stroke_width')
+
+    # ticks drawn on an axis at most, whatever the steps
+    max_ticks = 100
+
+    def __init__(self, data_dictionary=None):
+        super().__init__()
+        self.data_dictionary = data_dictionary
+
+    def set_x_column(self, x_column):
         """
-        Create HTML <svg> Tag Output for SVG Image.
+        Set the column of x values shared by every column, points indexes are used when it is not set
+        :param x_column:
         :return:
         """
-        self.complete_quantitative_attrs()
-        self.complete_histogram_attrs()
+        self.x_column = x_column
+        return self
 
-        all_counts = [
-            self._try_get_nested_value_from_dictionary(self._histogram_dictionary, self.columns[0], x, 'count') for x in
-            range(self.breaks)]
-        max_count = max(all_counts)
-        if max_count:
-            count_coefficient = self.max_y / max_count
+    def set_min_y_value(self, min_y):
+        self.min_y_value = min_y
+        return self
+
+    def set_max_y_value(self, max_y):
+        self.max_y_value = max_y
+        return self
+
+    def set_downsampling(self, method):
+        """
+        Set downsampling method of columns with more points than the svg_width
+        :param method: SeriesChart.LTTB, SeriesChart.MIN_MAX or None to draw every point
+        :return:
+        """
+        if method is not None and method not in METHODS:
+            raise ValueError('Unknown downsampling method: %r' % (method,))
+        self.downsampling = method
+        return self
+
+    def set_stroke_width(self, stroke_width):
+        self.stroke_width = stroke_width
+        return self
+
+    def _get_x_data(self):
+        if self.x_column is not None:
+            return self._get_column_data(self.x_column)
+
+    def _iter_data_fingerprint(self):
+        yield from super()._iter_data_fingerprint()
+        yield self._get_data_bytes(self._get_x_data())
+
+    def _get_x_range(self):
+        """
+        Get (min, max) of the x axis from settings, x column or points indexes, without changing the chart
+        :return:
+        """
+        min_x_value, max_x_value = self.min_x_value, self.max_x_value
+        x_data = self._get_x_data()
+        if x_data is not None:
+            x_bounds = stats.bounds(x_data)
         else:
-            count_coefficient = 0
+            sizes = [len(x) for x in map(self._get_column_data, self.columns) if x is not None and len(x)]
+            x_bounds = (0, max(sizes) - 1) if sizes else None
+        if x_bounds:
+            if not min_x_value:
+                min_x_value = x_bounds[0]
+            if not max_x_value:
+                max_x_value = x_bounds[1]
+        return min_x_value, max_x_value
 
-        x_axis_coefficient = self.svg_width / (self.max_x_value - self.min_x_value)
+    def compute(self, profile=None):
+        """
+        Compute downsampled points and scales from data and settings, without changing the chart
+        :param profile: instrumentation.ChartProfile recording phases timings, if any
+        :return: computation.SeriesResult
+        """
+        with instrumentation.phase(profile, instrumentation.ATTRIBUTES):
+            min_x_value, max_x_value = self._get_x_range()
+            columns_data = [(x, self._get_column_data(x)) for x in self.columns]
+            x_data = self._get_x_data()
+        return compute_series(columns_data, x_data, min_x_value, max_x_value, min_y_value=self.min_y_value,
+                              max_y_value=self.max_y_value, min_y=self.min_y, max_y=self.max_y,
+                              svg_width=self.svg_width, method=self.downsampling, profile=profile)
 
-        svg_string = '<svg width="%f" height="%f" aria-labelledby="title desc" role="img">' % (
-            self.svg_width + 100, self.max_y + 50)
+    def _iter_ticks(self, min_value, max_value, step):
+        """
+        Yield multiples of step between min and max values
+        :param min_value:
+        :param max_value:
+        :param step:
+        :return:
+        """
+        if not step or step <= 0:
+            return
+        first = math.ceil(min_value / step)
+        count = min(math.floor(max_value / step) - first + 1, self.max_ticks)
+        for index in range(max(count, 0)):
+            yield (first + index) * step
+
+    def _write_axes(self, writer, result):
+        """
+        Write axes with ticks every x_step/y_step and labels every x_number_step/y_number_step
+        :param writer: svg.SvgWriter
+        :param result:
+        :return:
+        """
+        left, right, top, bottom = 50, result.svg_width + 50, result.min_y, result.max_y
+        writer.element('line', x1=left, y1=bottom, x2=right, y2=bottom, stroke='#000', stroke_width=2)
+        writer.element('line', x1=left, y1=bottom, x2=left, y2=top, stroke='#000', stroke_width=2)
+        for value in self._iter_ticks(result.min_x_value, result.max_x_value, self.x_step):
+            x = result.x_scale * (value - result.min_x_value) + left
+            writer.element('line', x1=x, y1=bottom, x2=x, y2=bottom + 5, stroke='#000')
+        for value in self._iter_ticks(result.min_x_value, result.max_x_value, self.x_number_step):
+            x = result.x_scale * (value - result.min_x_value) + left
+            writer.element('text', str(round(value, 1)), x=x, y=bottom + 20, text_anchor='middle')
+        for value in self._iter_ticks(result.min_y_value, result.max_y_value, self.y_step):
+            y = bottom - result.y_scale * (value - result.min_y_value)
+            writer.element('line', x1=left - 5, y1=y, x2=left, y2=y, stroke='#000')
+        for value in self._iter_ticks(result.min_y_value, result.max_y_value, self.y_number_step):
+            y = bottom - result.y_scale * (value - result.min_y_value)
+            writer.element('text', str(round(value, 1)), x=left - 8, y=y, text_anchor='end')
+
+    def _get_path_data(self, writer, pixels):
+        """
+        Get the d attribute of the <path> of a column
+        :param writer: svg.SvgWriter, to format numbers
+        :param pixels: (x, y) pixel coordinates of the points
+        :return:
+        """
+        raise NotImplementedError
+
+    def _get_path_attributes(self, color):
+        """
+        Get attributes of the <path> of a column, other than d
+        :param color:
+        :return:
+        """
+        return {'fill': 'none', 'stroke': color, 'stroke_width': self.stroke_width}
+
+    def iter_svg(self, result=None):
+        """
+        Yield <svg> Tag fragments: header and axes, one <path> for each column, footer
+        :param result: computed result to render, computed from data when missing
+        :return:
+        """
+        if result is None:
+            result = self.compute()
+        writer = SvgWriter(self.precision)
+        writer.start('svg', xmlns=SVG_NAMESPACE, width=result.svg_width + 100, height=result.max_y + 50,
+                     aria_labelledby='title desc', role='img')
         if self.axis:
-            svg_string += '<line x1="0" y1="%f" x2="%f" y2="%f" style="stroke:rgb(0,0,0); stroke-width:2" />' % (
-                self.max_y, self.max_x_value * x_axis_coefficient, self.max_y)
-            svg_string += '<line x1="0" y1="%f" x2="0" y2="0" style="stroke:rgb(0,0,0); stroke-width:2" />' % (
-                self.max_y)
-        for bin_index in range(self.breaks):
-            bin_count = self._try_get_nested_value_from_dictionary(self._histogram_dictionary, self.columns[0],
-                                                                   bin_index,
-                                                                   'count')
-            min_bin_x_value = self._try_get_nested_value_from_dictionary(self._histogram_dictionary, self.columns[0],
-                                                                         bin_index,
-                                                                         'min')
-
-            bin_label_x_position = x_axis_coefficient * (min_bin_x_value - self.min_x_value) + 50
-            x_labels_height = 405
-
-            svg_string += '''
-                <g>
-                    <rect width="%f" height="%f" x="%f" y="%f"></rect>
-                    <text x="%f" y="%f" transform='rotate(90 %f %f)'>%s</text>
-                </g>
-            ''' % (x_axis_coefficient * self.bins_width, count_coefficient * bin_count,
-                   x_axis_coefficient * (min_bin_x_value - self.min_x_value) + 50,
-                   self.max_y - count_coefficient * bin_count,
-                   bin_label_x_position, x_labels_height,
-                   bin_label_x_position, x_labels_height,
-                   str(round(min_bin_x_value, 1)),
-                   )
-
-        svg_string += "</svg>"
-        return format_html(svg_string)
+            self._write_axes(writer, result)
+        yield writer.flush()
+        for index, column in enumerate(result.columns):
+            if not result.series[index][0]:
+                continue
+            color = self.colors[index % len(self.colors)]
+            writer.element('path', d=self._get_path_data(writer, result.iter_pixels(index)),
+                           **self._get_path_attributes(color))
+            yield writer.flush()
+        writer.end('svg')
+        yield writer.flush()
+
+
+class LineChart(SeriesChart):
+    """
+    Line chart, columns are downsampled with LTTB by default. x values must be sorted in increasing order.
+    """
+
+    def _get_path_data(self, writer, pixels):
+        commands = ['%s %s' % (writer.format_number(x), writer.format_number(y)) for x, y in pixels]
+        return 'M' + 'L'.join(commands)
+
+    def _get_path_attributes(self, color):
+        attributes = super()._get_path_attributes(color)
+        attributes['stroke_linejoin'] = 'round'
+        return attributes
+
+
+class ScatterChart(SeriesChart):
+    """
+    Scatter chart, columns are downsampled with MIN_MAX by default. Points are zero length segments with round caps
+    of one <path>, stroke_width is the points diameter.
+    """
+    downsampling = MIN_MAX
+    stroke_width = 4
+
+    def _get_path_data(self, writer, pixels):
+        return ''.join('M%s %sh0' % (writer.format_number(x), writer.format_number(y)) for x, y in pixels)
+
+    def _get_path_attributes(self, color):
+        attributes = super()._get_path_attributes(color)
+        attributes['stroke_linecap'] = 'round'
+        return attributes
@@ -0,0 +1,23 @@
+"""
+Django simple charts.
+
+Charts are importable from the package, ie. ``from charts import Histogram``.
+They are loaded on first use, as the optional dependencies of their backends
+(NumPy, the Django ORM, process pools), so importing the package stays cheap
+for processes never drawing a chart.
+"""
+import importlib
+
+CHARTS = ('Chart', 'QuantitativeChart', 'Histogram', 'SeriesChart', 'LineChart', 'ScatterChart')
+
+__all__ = list(CHARTS)
+
+
+def __getattr__(name):
+    if name in CHARTS:
+        return getattr(importlib.import_module('charts.Charts'), name)
+    raise AttributeError('module %r has no attribute %r' % (__name__, name))
+
+
+def __dir__():
+    return sorted(set(globals()) | set(CHARTS))
@@ -1,3 +1,9 @@
 from django.contrib import admin
 
-# Register your models here.
+from charts.models import ChartSnapshot
+
+
+@admin.register(ChartSnapshot)
+class ChartSnapshotAdmin(admin.ModelAdmin):
+    list_display = ('name', 'model', 'columns', 'breaks', 'last_pk', 'updated_at')
+    readonly_fields = ('edges', 'counts', 'summaries', 'last_pk', 'updated_at')
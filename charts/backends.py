@@ -0,0 +1,33 @@
+"""
+Computation backends shared by binning, order statistics and downsampling.
+
+Every computation has a pure Python backend and a vectorized NumPy backend,
+used when NumPy is installed. Modules keep their own ``default_backend`` so
+one computation can be forced to a backend (ie. by benchmarks) without the
+others.
+"""
+from charts.lazy import optional_module
+
+numpy = optional_module('numpy')
+
+PYTHON = 'python'
+NUMPY = 'numpy'
+BACKENDS = (PYTHON, NUMPY)
+
+
+def resolve_backend(backend, default=None):
+    """
+    Resolve the backend to use
+    :param backend: None for the default backend, PYTHON or NUMPY
+    :param default: default backend of the computation, None for NumPy when it is installed
+    :return: PYTHON or NUMPY
+    """
+    if backend is None:
+        backend = default
+    if backend is None:
+        return NUMPY if numpy is not None else PYTHON
+    if backend == NUMPY and numpy is None:
+        raise ImportError('NumPy backend requested but NumPy is not installed')
+    if backend not in BACKENDS:
+        raise ValueError('Unknown backend: %r' % (backend,))
+    return backend
@@ -0,0 +1,194 @@
+"""
+Benchmarks of Histogram compute and render paths.
+
+Every case builds histograms over synthetic columns and times
+``complete_quantitative_attrs``, ``complete_histogram_attrs`` and
+``html_svg`` separately (best of a number of repeats), then runs the case
+once more under ``tracemalloc`` to report the peak memory of every phase.
+The cold import of ``charts.Charts`` is timed as well, in new interpreters
+with ``-X importtime``. Run it with ``python manage.py charts_benchmark``.
+"""
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from array import array
+from contextlib import contextmanager
+
+from charts import binning, stats
+from charts.Charts import Histogram
+
+UNIFORM = 'uniform'
+SKEWED = 'skewed'
+DUPLICATES = 'duplicates'
+DISTRIBUTIONS = (UNIFORM, SKEWED, DUPLICATES)
+
+PHASES = ('complete_quantitative_attrs', 'complete_histogram_attrs', 'html_svg')
+
+# seconds, cold import of charts.Charts (Django core included) on a worker
+IMPORT_TIME_BUDGET = 0.15
+
+# modules loaded on first use only, they are not imported with charts.Charts
+LAZY_MODULES = ('numpy', 'asyncio', 'multiprocessing', 'concurrent.futures', 'django.db', 'django.utils.html')
+
+
+def generate_column(size, distribution=UNIFORM, seed=0):
+    """
+    Generate a synthetic column
+    :param size: number of values
+    :param distribution: UNIFORM, SKEWED (log-normal) or DUPLICATES (100 distinct values)
+    :param seed:
+    :return: array('d')
+    """
+    generator = random.Random(seed)
+    if distribution == UNIFORM:
+        values = (generator.uniform(0, 10000) for _ in range(size))
+    elif distribution == SKEWED:
+        values = (generator.lognormvariate(0, 1.5) for _ in range(size))
+    elif distribution == DUPLICATES:
+        values = (float(generator.randrange(100)) for _ in range(size))
+    else:
+        raise ValueError('Unknown distribution: %r' % (distribution,))
+    return array('d', values)
+
+
+@contextmanager
+def use_backend(backend):
+    """
+    Force binning and statistics backend
+    :param backend: binning.PYTHON, binning.NUMPY or None for automatic selection
+    :return:
+    """
+    previous = binning.default_backend, stats.default_backend
+    binning.default_backend = stats.default_backend = backend
+    try:
+        yield
+    finally:
+        binning.default_backend, stats.default_backend = previous
+
+
+def _run_phases(data_dictionary, columns, breaks, phase_hook):
+    """
+    Run every phase on a new histogram
+    :param data_dictionary:
+    :param columns:
+    :param breaks:
+    :param phase_hook: called with the name of every phase after it ran
+    :return: rendered markup
+    """
+    histogram = Histogram(data_dictionary).set_columns(columns).set_breaks(breaks)
+    histogram.complete_quantitative_attrs()
+    phase_hook(PHASES[0])
+    result = histogram.complete_histogram_attrs()
+    phase_hook(PHASES[1])
+    markup = histogram.html_svg(result)
+    phase_hook(PHASES[2])
+    return markup
+
+
+def run_case(size, breaks=None, columns=1, distribution=UNIFORM, backend=None, repeat=3, memory=True):
+    """
+    Benchmark a histogram case
+    :param size: number of values of every column
+    :param breaks: number of bins, None for the Freedman-Diaconis width
+    :param columns: number of columns
+    :param distribution: UNIFORM, SKEWED or DUPLICATES
+    :param backend: binning.PYTHON, binning.NUMPY or None for automatic selection
+    :param repeat: number of timed runs, the best is kept
+    :param memory: measure peak memory with tracemalloc
+    :return: dictionary of case parameters, timings (seconds), peak memory (bytes) and output size
+    """
+    column_names = ['col%d' % x for x in range(columns)]
+    data_dictionary = {x: {'data': generate_column(size, distribution, seed)}
+                       for seed, x in enumerate(column_names)}
+    timings = {x: None for x in PHASES}
+    peak_memory = dict()
+    with use_backend(backend):
+        for _ in range(repeat):
+            marks = [time.perf_counter()]
+            markup = _run_phases(data_dictionary, column_names, breaks, lambda phase: marks.append(time.perf_counter()))
+            for phase, start, end in zip(PHASES, marks, marks[1:]):
+                if timings[phase] is None or end - start < timings[phase]:
+                    timings[phase] = end - start
+
+        if memory:
+            def record_peak(phase):
+                peak_memory[phase] = tracemalloc.get_traced_memory()[1]
+                tracemalloc.reset_peak()
+
+            tracemalloc.start()
+            try:
+                _run_phases(data_dictionary, column_names, breaks, record_peak)
+            finally:
+                tracemalloc.stop()
+
+    return {
+        'size': size,
+        'breaks': breaks,
+        'columns': columns,
+        'distribution': distribution,
+        'backend': backend or ('numpy' if binning.numpy is not None else 'python'),
+        'timings': timings,
+        'peak_memory': peak_memory,
+        'output_bytes': len(markup.encode()),
+    }
+
+
+def measure_import(module='charts.Charts', repeat=3):
+    """
+    Time the cold import of a module in new interpreters
+    :param module:
+    :param repeat: number of interpreters, the best time is kept
+    :return: (seconds, set of the imported modules names)
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    best, imported = None, set()
+    for _ in range(repeat):
+        process = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import %s' % module], cwd=root,
+                                 stderr=subprocess.PIPE, universal_newlines=True, check=True)
+        # lines are "import time: self [us] | cumulative | imported package", after a header line
+        cumulative = None
+        for line in process.stderr.splitlines():
+            parts = [x.strip() for x in line.split('|')]
+            if len(parts) == 3 and parts[1].isdigit():
+                imported.add(parts[2])
+                if parts[2] == module:
+                    cumulative = int(parts[1]) / 1e6
+        if cumulative is not None and (best is None or cumulative < best):
+            best = cumulative
+    return best, imported
+
+
+def run(sizes=(1000, 10000, 100000), breaks=(10, 200), columns=(1,), distributions=DISTRIBUTIONS, backends=(None,),
+        repeat=3, memory=True):
+    """
+    Benchmark every combination of parameters
+    :return: dictionary of environment and cases results, serializable to JSON
+    """
+    cases = list()
+    for backend in backends:
+        for distribution in distributions:
+            for columns_count in columns:
+                for breaks_count in breaks:
+                    for size in sizes:
+                        cases.append(run_case(size, breaks_count, columns_count, distribution, backend, repeat,
+                                              memory))
+    return {
+        'python': platform.python_version(),
+        'numpy': getattr(binning.numpy, '__version__', None),
+        'import_time': measure_import()[0],
+        'cases': cases,
+    }
+
+
+def dumps(results):
+    """
+    Serialize results to JSON
+    :param results:
+    :return:
+    """
+    return json.dumps(results, indent=2, sort_keys=True)
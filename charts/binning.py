@@ -0,0 +1,314 @@
+"""
+Single pass binning engine for histograms.
+
+Every value is assigned to its bin once, either by index arithmetic (uniform
+bins) or by bisecting the sorted edges (user supplied, non-uniform bins).
+Bins are half open, a value ``x`` belongs to a bin when ``min <= x < max``.
+When NumPy is installed the vectorized backend is used.
+"""
+from bisect import bisect_right
+
+from charts.backends import NUMPY, PYTHON, numpy, resolve_backend
+
+# backend used when none is given, None for NumPy when it is installed
+default_backend = None
+
+
+def _select_backend(backend):
+    """
+    Resolve the backend to use for counting
+    :param backend: None for automatic selection, PYTHON or NUMPY
+    :return:
+    """
+    return resolve_backend(backend, default_backend)
+
+
+def uniform_bin_ranges(min_value, width, breaks):
+    """
+    Get (min, max) pair for every bin of a uniform histogram
+    :param min_value: lower bound of the first bin
+    :param width: bins width
+    :param breaks: number of bins
+    :return:
+    """
+    ranges = list()
+    for bin_index in range(breaks):
+        min_bin = min_value + bin_index * width
+        ranges.append((min_bin, min_bin + width))
+    return ranges
+
+
+def edges_bin_ranges(edges):
+    """
+    Get (min, max) pair for every bin delimited by sorted edges
+    :param edges:
+    :return:
+    """
+    return list(zip(edges[:-1], edges[1:]))
+
+
+def _check_edges(edges):
+    """
+    Check edges are strictly increasing and define at least one bin
+    :param edges:
+    :return:
+    """
+    if len(edges) < 2:
+        raise ValueError('At least two edges are required')
+    if any(low >= high for low, high in zip(edges[:-1], edges[1:])):
+        raise ValueError('Edges must be strictly increasing')
+
+
+def _python_count_uniform(data, min_value, width, breaks, ranges):
+    counts = [0] * breaks
+    lows = [low for low, _ in ranges]
+    highs = [high for _, high in ranges]
+    lower_bound, upper_bound = lows[0], highs[-1]
+    for value in data:
+        if not lower_bound <= value < upper_bound:
+            continue
+        # The arithmetic guess can be one bin off near the bin bounds because of
+        # rounding, so the neighbours are checked with the exact comparisons.
+        index = int((value - min_value) // width)
+        for candidate in range(max(index - 1, 0), min(index + 2, breaks)):
+            if lows[candidate] <= value < highs[candidate]:
+                counts[candidate] += 1
+    return counts
+
+
+def _numpy_stack(columns):
+    """
+    Concatenate columns in one array with the row (column index) of every value
+    :param columns:
+    :return: values, rows
+    """
+    arrays = [numpy.asarray(x if x is not None else (), dtype=float) for x in columns]
+    values = numpy.concatenate(arrays) if arrays else numpy.zeros(0)
+    rows = numpy.repeat(numpy.arange(len(arrays), dtype=numpy.intp), [len(x) for x in arrays])
+    return values, rows
+
+
+def _numpy_count_uniform(columns, min_value, width, breaks, ranges):
+    lows = numpy.array([low for low, _ in ranges], dtype=float)
+    highs = numpy.array([high for _, high in ranges], dtype=float)
+    values, rows = _numpy_stack(columns)
+    in_range = (values >= lows[0]) & (values < highs[-1])
+    values, rows = values[in_range], rows[in_range]
+    index = numpy.floor((values - min_value) / width).astype(numpy.intp)
+    size = len(columns) * breaks
+    counts = numpy.zeros(size, dtype=numpy.int64)
+    for offset in (-1, 0, 1):
+        candidate = index + offset
+        valid = (candidate >= 0) & (candidate < breaks)
+        candidate, candidate_values, candidate_rows = candidate[valid], values[valid], rows[valid]
+        hit = (lows[candidate] <= candidate_values) & (candidate_values < highs[candidate])
+        counts += numpy.bincount(candidate_rows[hit] * breaks + candidate[hit], minlength=size)
+    return counts.reshape(len(columns), breaks).tolist()
+
+
+def _numpy_count_edges(columns, edges):
+    breaks = len(edges) - 1
+    edges_array = numpy.asarray(edges, dtype=float)
+    values, rows = _numpy_stack(columns)
+    in_range = (values >= edges_array[0]) & (values < edges_array[-1])
+    values, rows = values[in_range], rows[in_range]
+    index = numpy.searchsorted(edges_array, values, side='right') - 1
+    size = len(columns) * breaks
+    return numpy.bincount(rows * breaks + index, minlength=size).reshape(len(columns), breaks).tolist()
+
+
+def _python_count_edges(data, edges):
+    counts = [0] * (len(edges) - 1)
+    lower_bound, upper_bound = edges[0], edges[-1]
+    for value in data:
+        if lower_bound <= value < upper_bound:
+            counts[bisect_right(edges, value) - 1] += 1
+    return counts
+
+
+def count_uniform_matrix(columns, min_value, width, breaks, backend=None):
+    """
+    Count data of several columns in every bin of a uniform histogram in one pass
+    :param columns: list of iterables of numbers (None for a column without data)
+    :param min_value: lower bound of the first bin
+    :param width: bins width
+    :param breaks: number of bins
+    :param backend: None for automatic selection, PYTHON or NUMPY
+    :return: list of counts for every column, each with one count for each bin
+    """
+    if not breaks:
+        return [list() for _ in columns]
+    if not width > 0 or not columns:
+        return [[0] * breaks for _ in columns]
+    ranges = uniform_bin_ranges(min_value, width, breaks)
+    if _select_backend(backend) == NUMPY:
+        return _numpy_count_uniform(columns, min_value, width, breaks, ranges)
+    return [_python_count_uniform(x if x is not None else (), min_value, width, breaks, ranges) for x in columns]
+
+
+def count_edges_matrix(columns, edges, backend=None):
+    """
+    Count data of several columns in every bin delimited by strictly increasing edges in one pass
+    :param columns: list of iterables of numbers (None for a column without data)
+    :param edges: sorted bins edges, n + 1 edges for n bins
+    :param backend: None for automatic selection, PYTHON or NUMPY
+    :return: list of counts for every column, each with one count for each bin
+    """
+    _check_edges(edges)
+    if not columns:
+        return list()
+    if _select_backend(backend) == NUMPY:
+        return _numpy_count_edges(columns, edges)
+    return [_python_count_edges(x if x is not None else (), edges) for x in columns]
+
+
+def _python_count_uniform_sparse(data, min_value, width, breaks):
+    counts = dict()
+    upper_bound = min_value + (breaks - 1) * width + width
+    for value in data:
+        if not min_value <= value < upper_bound:
+            continue
+        index = int((value - min_value) // width)
+        for candidate in range(max(index - 1, 0), min(index + 2, breaks)):
+            # same bounds as uniform_bin_ranges, without a table of every bin
+            low = min_value + candidate * width
+            if low <= value < low + width:
+                counts[candidate] = counts.get(candidate, 0) + 1
+    return counts
+
+
+def _numpy_count_uniform_sparse(columns, min_value, width, breaks):
+    values, rows = _numpy_stack(columns)
+    in_range = (values >= min_value) & (values < min_value + (breaks - 1) * width + width)
+    values, rows = values[in_range], rows[in_range]
+    index = numpy.floor((values - min_value) / width).astype(numpy.int64)
+    keys = list()
+    for offset in (-1, 0, 1):
+        candidate = index + offset
+        valid = (candidate >= 0) & (candidate < breaks)
+        candidate, candidate_values, candidate_rows = candidate[valid], values[valid], rows[valid]
+        lows = min_value + candidate * width
+        hit = (lows <= candidate_values) & (candidate_values < lows + width)
+        keys.append(candidate_rows[hit] * breaks + candidate[hit])
+    keys, counts = numpy.unique(numpy.concatenate(keys), return_counts=True)
+    sparse_counts = [dict() for _ in columns]
+    for row, bin_index, count in zip((keys // breaks).tolist(), (keys % breaks).tolist(), counts.tolist()):
+        sparse_counts[row][bin_index] = count
+    return sparse_counts
+
+
+def count_uniform_sparse(columns, min_value, width, breaks, backend=None):
+    """
+    Count data of several columns in the occupied bins of a uniform histogram, memory is O(occupied bins)
+    :param columns: list of iterables of numbers (None for a column without data)
+    :param min_value: lower bound of the first bin
+    :param width: bins width
+    :param breaks: number of bins
+    :param backend: None for automatic selection, PYTHON or NUMPY
+    :return: list of dictionaries of bin index to count (non zero) for every column
+    """
+    if not breaks or not width > 0 or not columns:
+        return [dict() for _ in columns]
+    if _select_backend(backend) == NUMPY:
+        return _numpy_count_uniform_sparse(columns, min_value, width, breaks)
+    return [_python_count_uniform_sparse(x if x is not None else (), min_value, width, breaks) for x in columns]
+
+
+def count_uniform(data, min_value, width, breaks, backend=None):
+    """
+    Count data in every bin of a uniform histogram in one pass
+    :param data: iterable of numbers
+    :param min_value: lower bound of the first bin
+    :param width: bins width
+    :param breaks: number of bins
+    :param backend: None for automatic selection, PYTHON or NUMPY
+    :return: list of counts, one for each bin
+    """
+    return count_uniform_matrix([data], min_value, width, breaks, backend)[0]
+
+
+def count_edges(data, edges, backend=None):
+    """
+    Count data in every bin delimited by strictly increasing edges in one pass
+    :param data: iterable of numbers
+    :param edges: sorted bins edges, n + 1 edges for n bins
+    :param backend: None for automatic selection, PYTHON or NUMPY
+    :return: list of counts, one for each bin
+    """
+    return count_edges_matrix([data], edges, backend)[0]
+
+
+class BinCounter(object):
+    """
+    Accumulate counts of fixed bins from chunks of data, memory is O(bins)
+    """
+
+    def __init__(self, min_value=None, width=None, breaks=None, edges=None, backend=None):
+        """
+        Bins are uniform (min_value, width, breaks) or delimited by sorted edges
+        :param min_value: lower bound of the first uniform bin
+        :param width: uniform bins width
+        :param breaks: number of uniform bins
+        :param edges: sorted bins edges, n + 1 edges for n bins
+        :param backend: None for automatic selection, PYTHON or NUMPY
+        """
+        if edges:
+            _check_edges(edges)
+            self.edges = list(edges)
+            self.bin_ranges = edges_bin_ranges(self.edges)
+        elif None in (min_value, width, breaks):
+            raise ValueError('BinCounter needs edges or min_value, width and breaks')
+        else:
+            self.edges = None
+            self.bin_ranges = uniform_bin_ranges(min_value, width, breaks)
+        self.min_value = min_value
+        self.width = width
+        self.backend = backend
+        self.counts = [0] * len(self.bin_ranges)
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    @property
+    def outside(self):
+        """
+        Number of values out of the bins range
+        :return:
+        """
+        return self.total - sum(self.counts)
+
+    def _count(self, values):
+        if self.edges:
+            return count_edges(values, self.edges, self.backend)
+        return count_uniform(values, self.min_value, self.width, len(self.counts), self.backend)
+
+    def update(self, values):
+        """
+        Add a chunk of values
+        :param values: sequence of numbers
+        :return: self
+        """
+        if not len(values):
+            return self
+        self.counts = [x + y for x, y in zip(self.counts, self._count(values))]
+        self.total += len(values)
+        chunk_min, chunk_max = min(values), max(values)
+        self.min = chunk_min if self.min is None else min(self.min, chunk_min)
+        self.max = chunk_max if self.max is None else max(self.max, chunk_max)
+        return self
+
+    def merge(self, other):
+        """
+        Add counts of another counter with the same bins
+        :param other: BinCounter
+        :return: self
+        """
+        if other.bin_ranges != self.bin_ranges:
+            raise ValueError('Only counters with the same bins can be merged')
+        self.counts = [x + y for x, y in zip(self.counts, other.counts)]
+        self.total += other.total
+        for value in (other.min, other.max):
+            if value is not None:
+                self.min = value if self.min is None else min(self.min, value)
+                self.max = value if self.max is None else max(self.max, value)
+        return self
@@ -0,0 +1,182 @@
+"""
+Render cache for charts markup.
+
+Rendered markup is stored under a fingerprint of the chart data and settings,
+either in a Django cache alias or in a process local LRU cache. Defaults are
+read from the ``SIMPLE_CHARTS_RENDER_CACHE`` setting, ie::
+
+    SIMPLE_CHARTS_RENDER_CACHE = {
+        'ALIAS': 'charts',    # Django cache alias, None for the local LRU cache
+        'TIMEOUT': 300,       # seconds, None to never expire
+        'MAX_ENTRIES': 128,   # local LRU cache size
+    }
+"""
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_TIMEOUT = 300
+DEFAULT_MAX_ENTRIES = 128
+
+
+class LocalLRUCache(object):
+    """
+    Thread safe in memory LRU cache with expiration
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout=None):
+        expires_at = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RenderCache(object):
+    """
+    Cache of rendered charts markup with hit/miss counters
+    """
+    key_prefix = 'simple_charts'
+
+    def __init__(self, alias=None, timeout=DEFAULT_TIMEOUT, max_entries=DEFAULT_MAX_ENTRIES):
+        """
+        :param alias: Django cache alias, None for a process local LRU cache
+        :param timeout: seconds before an entry expires, None to never expire
+        :param max_entries: size of the local LRU cache
+        """
+        if alias is None:
+            self.backend = LocalLRUCache(max_entries)
+        else:
+            from django.core.cache import caches
+            self.backend = caches[alias]
+        self.alias = alias
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self._counters_lock = threading.Lock()
+
+    def get_key(self, chart):
+        """
+        Get the cache key of a chart, computing the chart fingerprint (which hashes its data unless a data version
+        is set, see Chart.set_data_version)
+        :param chart:
+        :return:
+        """
+        return '%s:%s' % (self.key_prefix, chart.fingerprint())
+
+    def _count(self, hit):
+        with self._counters_lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, chart, key=None):
+        """
+        Get cached markup of a chart
+        :param chart: Chart object, used for the key
+        :param key: key of the chart from get_key, computed when missing
+        :return: None when the chart is not cached
+        """
+        markup = self.backend.get(key or self.get_key(chart))
+        self._count(markup is not None)
+        return markup
+
+    def set(self, chart, markup, key=None):
+        """
+        Store markup of a chart
+        :param chart: Chart object, used for the key
+        :param markup:
+        :param key: key of the chart from get_key, computed when missing
+        :return:
+        """
+        self.backend.set(key or self.get_key(chart), markup, self.timeout)
+
+    def get_or_render(self, chart, render):
+        """
+        Get cached markup of a chart or render and store it
+        :param chart: Chart object, used for the key
+        :param render: callable returning the markup
+        :return:
+        """
+        key = self.get_key(chart)
+        markup = self.get(chart, key)
+        if markup is None:
+            markup = render()
+            self.set(chart, markup, key)
+        return markup
+
+    def invalidate(self, chart):
+        """
+        Remove cached markup of a chart
+        :param chart:
+        :return:
+        """
+        self.backend.delete(self.get_key(chart))
+
+    def clear(self):
+        """
+        Remove every cached markup, on a Django alias the whole alias is cleared.
+        :return:
+        """
+        self.backend.clear()
+
+    def reset_counters(self):
+        with self._counters_lock:
+            self.hits = 0
+            self.misses = 0
+
+    @property
+    def hit_ratio(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_cache():
+    """
+    Get the render cache configured by SIMPLE_CHARTS_RENDER_CACHE setting
+    :return:
+    """
+    global _default_cache
+    if _default_cache is None:
+        with _default_cache_lock:
+            if _default_cache is None:
+                from django.conf import settings
+                options = getattr(settings, 'SIMPLE_CHARTS_RENDER_CACHE', {})
+                _default_cache = RenderCache(alias=options.get('ALIAS'),
+                                             timeout=options.get('TIMEOUT', DEFAULT_TIMEOUT),
+                                             max_entries=options.get('MAX_ENTRIES', DEFAULT_MAX_ENTRIES))
+    return _default_cache
@@ -0,0 +1,93 @@
+"""
+Compact storage of chart columns.
+
+Columns may be given as ``array('d')``, NumPy arrays, ``memoryview`` or any
+object exporting the buffer protocol, they are used without copying when
+their items are already doubles. A Python float in a list costs about 32
+bytes, the same value in a double buffer costs 8.
+"""
+import mmap
+from array import array
+from itertools import chain
+
+from charts.lazy import optional_module
+
+numpy = optional_module('numpy')
+
+DOUBLE = 'd'
+
+
+def compact_column(values):
+    """
+    Copy numbers into a compact array of doubles
+    :param values: iterable of numbers
+    :return: array('d')
+    """
+    return array(DOUBLE, values)
+
+
+def concatenate_columns(columns):
+    """
+    Copy several columns into one compact array
+    :param columns: list of columns data
+    :return: NumPy array of floats when NumPy is installed, array('d') otherwise
+    """
+    if numpy is not None:
+        return numpy.concatenate([numpy.asarray(x, dtype=float) for x in columns])
+    return compact_column(chain.from_iterable(columns))
+
+
+def _normalize_buffer(values):
+    view = memoryview(values)
+    if view.ndim != 1:
+        view = view.cast('B').cast(view.format)
+    if view.format in ('B', 'b', 'c'):
+        # raw bytes are read as native doubles
+        return view.cast(DOUBLE)
+    if view.format == DOUBLE:
+        return view
+    if numpy is not None:
+        return numpy.asarray(view, dtype=float)
+    return compact_column(view)
+
+
+def normalize_column(values):
+    """
+    Get column data as a sized sequence of numbers, copying only when needed.
+    Lists, tuples, array('d'), float NumPy arrays and double buffers are kept as they are, raw bytes
+    buffers (ie. bytes or mmap) are read as native doubles, other arrays and buffers are converted to
+    doubles and other iterables (ie. generators) are copied into array('d').
+    :param values:
+    :return:
+    """
+    if values is None or isinstance(values, (list, tuple, range)):
+        return values
+    if isinstance(values, array):
+        return values if values.typecode == DOUBLE else compact_column(values)
+    if numpy is not None and isinstance(values, numpy.ndarray):
+        return numpy.asarray(values, dtype=float).ravel()
+    try:
+        return _normalize_buffer(values)
+    except TypeError:
+        pass
+    if hasattr(values, '__len__') and hasattr(values, '__getitem__'):
+        return values
+    return compact_column(values)
+
+
+def load_column(path, typecode=DOUBLE, offset=0, length=None):
+    """
+    Map a binary file of packed native numbers as a read only column, without copying it
+    :param path: file path
+    :param typecode: array typecode of the packed numbers ('d' for doubles)
+    :param offset: number of bytes to skip at the start of the file
+    :param length: number of values, all remaining values when None
+    :return: memoryview of the mapped file (numpy array for typecodes other than 'd' when NumPy is installed)
+    """
+    with open(path, 'rb') as column_file:
+        mapped = mmap.mmap(column_file.fileno(), 0, access=mmap.ACCESS_READ)
+    item_size = array(typecode).itemsize
+    if length is None:
+        length = (len(mapped) - offset) // item_size
+    view = memoryview(mapped)[offset:offset + length * item_size].cast(typecode)
+    return normalize_column(view)
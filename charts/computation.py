@@ -0,0 +1,450 @@
+"""
+Pure computation of chart results.
+
+The functions of this module only read their arguments and return immutable
+result objects, so a computed result can be shared between threads and
+rendered any number of times.
+"""
+import math
+
+from charts import binning, downsampling, instrumentation, parallel, stats
+
+DEFAULT_MAX_Y = 400
+
+# bins of histograms at most, more bins than pixels are not visible
+DEFAULT_MAX_BREAKS = 1000
+
+# layouts of multi-column histograms
+OVERLAID = 'overlaid'
+STACKED = 'stacked'
+GROUPED = 'grouped'
+LAYOUTS = (OVERLAID, STACKED, GROUPED)
+
+# scales of histograms x axis, LOG bins have the same width in log scale
+LINEAR = 'linear'
+LOG = 'log'
+SCALES = (LINEAR, LOG)
+
+
+class ImmutableResult(object):
+    """
+    Base of computed results: attributes are set once by __init__ and results stay picklable
+    """
+    __slots__ = ()
+
+    def _set_values(self, values):
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('%s is immutable' % self.__class__.__name__)
+
+    def __delattr__(self, name):
+        raise AttributeError('%s is immutable' % self.__class__.__name__)
+
+    def __getstate__(self):
+        return {x: getattr(self, x) for x in self.__slots__}
+
+    def __setstate__(self, state):
+        self._set_values(state)
+
+
+class HistogramResult(ImmutableResult):
+    """
+    Immutable computed histogram: bins, count matrix (one row for each column), scales and axis ranges.
+    Sparse histograms only have their occupied bins.
+    """
+    __slots__ = ('columns', 'bin_ranges', 'matrix', 'counts', 'layout', 'bins_width', 'breaks', 'scale',
+                 'min_x_value', 'max_x_value', 'min_y', 'max_y', 'svg_width', 'max_count', 'x_scale', 'y_scale')
+
+    def __init__(self, columns, bin_ranges, matrix, bins_width, min_x_value, max_x_value, min_y, max_y,
+                 svg_width, layout=OVERLAID, breaks=None, scale=LINEAR):
+        """
+        :param columns: ordered column names
+        :param bin_ranges: (min, max) pair for every bin
+        :param matrix: counts of every column (one for each bin), in columns order
+        :param bins_width: width of uniform bins, None for user supplied edges
+        :param min_x_value:
+        :param max_x_value:
+        :param min_y:
+        :param max_y:
+        :param svg_width:
+        :param layout: OVERLAID, STACKED or GROUPED
+        :param breaks: number of bins of the histogram, empty ones included, None for the number of bin ranges
+        :param scale: LINEAR or LOG
+        """
+        if layout not in LAYOUTS:
+            raise ValueError('Unknown histogram layout: %r' % (layout,))
+        if scale not in SCALES:
+            raise ValueError('Unknown histogram scale: %r' % (scale,))
+        matrix = tuple(tuple(x) for x in matrix)
+        if layout == STACKED:
+            max_count = max([sum(x) for x in zip(*matrix)] or [0])
+        else:
+            max_count = max([max(x) for x in matrix if x] or [0])
+        if scale == LOG:
+            x_range = math.log10(max_x_value) - math.log10(min_x_value)
+        else:
+            x_range = max_x_value - min_x_value
+        values = {
+            'columns': tuple(columns),
+            'bin_ranges': tuple(tuple(x) for x in bin_ranges),
+            'matrix': matrix,
+            'counts': dict(zip(columns, matrix)),
+            'layout': layout,
+            'bins_width': bins_width,
+            'breaks': len(bin_ranges) if breaks is None else breaks,
+            'scale': scale,
+            'min_x_value': min_x_value,
+            'max_x_value': max_x_value,
+            'min_y': min_y,
+            'max_y': max_y,
+            'svg_width': svg_width,
+            'max_count': max_count,
+            'x_scale': svg_width / x_range if x_range else 0,
+            'y_scale': max_y / max_count if max_count else 0,
+        }
+        self._set_values(values)
+
+    def x_position(self, value):
+        """
+        Get the pixel position of a value on the x axis, the plot starts at x = 50
+        :param value:
+        :return:
+        """
+        if self.scale == LOG:
+            return self.x_scale * (math.log10(value) - math.log10(self.min_x_value)) + 50
+        return self.x_scale * (value - self.min_x_value) + 50
+
+    def x_length(self, low, high):
+        """
+        Get the pixel length of a range on the x axis
+        :param low:
+        :param high:
+        :return:
+        """
+        if self.scale == LOG:
+            return self.x_scale * (math.log10(high) - math.log10(low))
+        return self.x_scale * (high - low)
+
+    def bins(self, column):
+        """
+        Get (min, max, count) for every bin of a column
+        :param column:
+        :return:
+        """
+        return tuple((x_min, x_max, count) for (x_min, x_max), count in zip(self.bin_ranges, self.counts[column]))
+
+    def iter_bins(self):
+        """
+        Iterate bins with counts of every column
+        :return: (min, max, counts) for every bin, counts in columns order
+        """
+        return zip([x_min for x_min, _ in self.bin_ranges], [x_max for _, x_max in self.bin_ranges], zip(*self.matrix))
+
+
+def freedman_diaconis_width(summary):
+    """
+    Get Default histogram width (Freedman-Diaconis rule)
+    :param summary: stats.Summary of the data
+    :return:
+    """
+    if summary:
+        return 2 * summary.interquartile_range / (summary.count ** (1 / 3))
+
+
+def uniform_bins_width(min_x_value, max_x_value, breaks):
+    """
+    Get width of uniform bins for a number of breaks
+    :param min_x_value:
+    :param max_x_value:
+    :param breaks:
+    :return:
+    """
+    return math.ceil((max_x_value - min_x_value) / breaks)
+
+
+def get_uniform_bins(min_x_value, max_x_value, breaks=None, aggregated_summary=None, max_breaks=None):
+    """
+    Get width and number of uniform bins from settings
+    :param min_x_value: lower bound of the first bin
+    :param max_x_value: upper bound of the x axis
+    :param breaks: number of bins, None for the Freedman-Diaconis width
+    :param aggregated_summary: stats.Summary of all columns data, needed without breaks
+    :param max_breaks: maximum number of bins derived from the Freedman-Diaconis width, above it bins are merged by
+        a whole factor, given breaks are kept
+    :return: (bins width, breaks)
+    """
+    if breaks:
+        bins_width = uniform_bins_width(min_x_value, max_x_value, breaks)
+    else:
+        bins_width = freedman_diaconis_width(aggregated_summary)
+        breaks = math.ceil((max_x_value - min_x_value) / bins_width) if bins_width else 0
+        if max_breaks and breaks > max_breaks:
+            bins_width = bins_width * math.ceil(breaks / max_breaks)
+            breaks = math.ceil((max_x_value - min_x_value) / bins_width)
+    return bins_width, breaks
+
+
+def get_log_edges(min_x_value, max_x_value, breaks=None, aggregated_summary=None, max_breaks=None):
+    """
+    Get edges of bins of the same width in log scale
+    :param min_x_value: lower bound of the first bin, positive
+    :param max_x_value: upper bound of the x axis
+    :param breaks: number of bins, None for the Freedman-Diaconis width of the data logarithms
+    :param aggregated_summary: stats.Summary of all columns data, needed without breaks
+    :param max_breaks: maximum number of bins derived from the Freedman-Diaconis width, above it bins are merged by
+        a whole factor, given breaks are kept
+    :return: edges, n + 1 edges for n bins
+    """
+    if not min_x_value > 0:
+        raise ValueError('Log scale histograms need a positive minimum, got %r' % (min_x_value,))
+    log_min, log_max = math.log10(min_x_value), math.log10(max_x_value)
+    if breaks:
+        log_width = (log_max - log_min) / breaks
+    else:
+        summary = aggregated_summary
+        log_width = None
+        if summary and summary.q1 > 0:
+            log_width = 2 * (math.log10(summary.q3) - math.log10(summary.q1)) / (summary.count ** (1 / 3))
+        breaks = math.ceil((log_max - log_min) / log_width) if log_width else 0
+        if max_breaks and breaks > max_breaks:
+            log_width = log_width * math.ceil(breaks / max_breaks)
+            breaks = math.ceil((log_max - log_min) / log_width)
+    if not breaks:
+        return list()
+    edges = [min_x_value] + [10 ** (log_min + x * log_width) for x in range(1, breaks + 1)]
+    # bins are half open and the rounded last edge may be at or below the max, the max is in the last bin
+    edges[-1] = max(edges[-1], math.nextafter(max_x_value, math.inf))
+    return edges
+
+
+def get_bins_edges(bin_ranges):
+    """
+    Get edges of contiguous bins
+    :param bin_ranges: (min, max) pair for every bin
+    :return:
+    """
+    if not bin_ranges:
+        return list()
+    return [low for low, _ in bin_ranges] + [bin_ranges[-1][1]]
+
+
+def get_histogram_bins(min_x_value, max_x_value, breaks=None, edges=None, aggregated_summary=None, scale=LINEAR,
+                       max_breaks=None):
+    """
+    Get bins of a histogram from settings
+    :param min_x_value: lower bound of the first bin
+    :param max_x_value: upper bound of the x axis
+    :param breaks: number of uniform bins, None for the Freedman-Diaconis width
+    :param edges: sorted bins edges for non-uniform bins, they take precedence over breaks
+    :param aggregated_summary: stats.Summary of all columns data, needed without breaks and edges
+    :param scale: LINEAR or LOG
+    :param max_breaks: maximum number of bins derived from the Freedman-Diaconis width, above it bins are merged by
+        a whole factor, given breaks are kept
+    :return: bins width (None for edges and LOG scale) and (min, max) pair for every bin
+    """
+    if edges:
+        return None, binning.edges_bin_ranges(edges)
+    if scale == LOG:
+        log_edges = get_log_edges(min_x_value, max_x_value, breaks, aggregated_summary, max_breaks)
+        return None, binning.edges_bin_ranges(log_edges) if log_edges else list()
+    bins_width, breaks = get_uniform_bins(min_x_value, max_x_value, breaks, aggregated_summary, max_breaks)
+    return bins_width, binning.uniform_bin_ranges(min_x_value, bins_width, breaks)
+
+
+def compute_histogram(columns_data, min_x_value, max_x_value, breaks=None, edges=None, max_y=None, svg_width=400,
+                      aggregated_summary=None, binned_counts=None, layout=OVERLAID, profile=None,
+                      parallel_binning=None, scale=LINEAR, sparse=False, max_breaks=None, binned_ranges=None):
+    """
+    Compute a histogram from data and settings
+    :param columns_data: ordered list of (column, data) pairs
+    :param min_x_value: lower bound of the first bin
+    :param max_x_value: upper bound of the x axis
+    :param breaks: number of uniform bins, None for the Freedman-Diaconis width
+    :param edges: sorted bins edges for non-uniform bins, they take precedence over breaks
+    :param max_y: height of the highest bin
+    :param svg_width:
+    :param aggregated_summary: stats.Summary of all columns data, needed without breaks and edges
+    :param binned_counts: dictionary of column to counts already binned with the same bins
+    :param layout: OVERLAID, STACKED or GROUPED
+    :param profile: instrumentation.ChartProfile recording phases timings, if any
+    :param parallel_binning: bin in a process pool, None to bin in parallel above parallel.threshold values
+    :param scale: LINEAR or LOG
+    :param sparse: keep only occupied bins, uniform bins are counted in O(occupied bins) memory
+    :param max_breaks: maximum number of bins derived from the Freedman-Diaconis width, above it bins are merged by
+        a whole factor, given breaks are kept
+    :param binned_ranges: dictionary of column to (min, max) pair for every bin of its binned counts, checked against
+        the histogram bins
+    :return: HistogramResult
+    """
+    sparse_uniform = sparse and not edges and scale == LINEAR
+    if sparse_uniform:
+        bins_width, breaks = get_uniform_bins(min_x_value, max_x_value, breaks, aggregated_summary, max_breaks)
+        bin_ranges = bins_edges = None
+    else:
+        bins_width, bin_ranges = get_histogram_bins(min_x_value, max_x_value, breaks, edges, aggregated_summary,
+                                                    scale, max_breaks)
+        breaks = len(bin_ranges)
+        bins_edges = edges or (get_bins_edges(bin_ranges) if bins_width is None else None)
+
+    binned_counts = binned_counts or dict()
+    for column, counts in binned_counts.items():
+        if len(counts) != breaks:
+            raise ValueError('Binned counts of column %r do not match the histogram bins' % (column,))
+    if binned_ranges:
+        # sparse uniform bins have no ranges, counters hold every bin anyway
+        expected_ranges = bin_ranges if bin_ranges is not None else \
+            binning.uniform_bin_ranges(min_x_value, bins_width, breaks)
+        expected_ranges = tuple(tuple(x) for x in expected_ranges)
+        for column, ranges in binned_ranges.items():
+            if tuple(tuple(x) for x in ranges) != expected_ranges:
+                raise ValueError('Binned counts of column %r do not match the histogram bins' % (column,))
+    # every column left to bin is counted in a single pass
+    columns_to_bin = [(column, data) for column, data in columns_data if column not in binned_counts]
+    data_list = [data if data is not None and len(data) else None for _, data in columns_to_bin]
+    if parallel_binning is None:
+        parallel_binning = parallel.is_worth(data_list)
+    with instrumentation.phase(profile, instrumentation.BINNING):
+        if sparse_uniform:
+            matrix = binning.count_uniform_sparse(data_list, min_x_value, bins_width, breaks)
+        elif parallel_binning:
+            matrix = parallel.count_matrix(data_list, min_x_value, bins_width, breaks, bins_edges)
+        elif bins_edges:
+            matrix = binning.count_edges_matrix(data_list, bins_edges)
+        else:
+            matrix = binning.count_uniform_matrix(data_list, min_x_value, bins_width, breaks)
+    counts = dict(binned_counts)
+    counts.update(zip([column for column, _ in columns_to_bin], matrix))
+
+    columns = [column for column, _ in columns_data]
+    matrix = [counts[x] for x in columns]
+    if sparse:
+        bin_ranges, matrix = _get_occupied_bins(matrix, bin_ranges, min_x_value, bins_width)
+    with instrumentation.phase(profile, instrumentation.SCALING):
+        return HistogramResult(columns, bin_ranges, matrix, bins_width, min_x_value, max_x_value, 0,
+                               max_y or DEFAULT_MAX_Y, svg_width, layout, breaks, scale)
+
+
+def _get_occupied_bins(matrix, bin_ranges, min_x_value, bins_width):
+    """
+    Keep bins with a count in any column
+    :param matrix: counts of every column, lists of every bin count or dictionaries of occupied bin index to count
+    :param bin_ranges: (min, max) pair for every bin, None for uniform bins
+    :param min_x_value: lower bound of the first uniform bin
+    :param bins_width: uniform bins width
+    :return: (min, max) pair and counts of every column for occupied bins
+    """
+    matrix = [x if isinstance(x, dict) else {index: count for index, count in enumerate(x) if count} for x in matrix]
+    occupied = sorted(set().union(*matrix))
+    if bin_ranges is None:
+        # same bounds as binning.uniform_bin_ranges
+        bin_ranges = [(min_x_value + x * bins_width, min_x_value + x * bins_width + bins_width) for x in occupied]
+    else:
+        bin_ranges = [bin_ranges[x] for x in occupied]
+    return bin_ranges, [[x.get(index, 0) for index in occupied] for x in matrix]
+
+
+class SeriesResult(ImmutableResult):
+    """
+    Immutable computed line or scatter chart: downsampled points of every column, scales and axis ranges
+    """
+    __slots__ = ('columns', 'series', 'sizes', 'downsampling', 'min_x_value', 'max_x_value', 'min_y_value',
+                 'max_y_value', 'min_y', 'max_y', 'svg_width', 'x_scale', 'y_scale')
+
+    def __init__(self, columns, series, sizes, min_x_value, max_x_value, min_y_value, max_y_value, min_y, max_y,
+                 svg_width, downsampling=None):
+        """
+        :param columns: ordered column names
+        :param series: (xs, ys) pair of drawn points of every column, in columns order
+        :param sizes: number of visible points of every column before downsampling, in columns order
+        :param min_x_value:
+        :param max_x_value:
+        :param min_y_value: value drawn at the bottom of the plot
+        :param max_y_value: value drawn at the top of the plot
+        :param min_y: top of the plot in pixels
+        :param max_y: bottom of the plot in pixels
+        :param svg_width:
+        :param downsampling: downsampling method, None when every point is drawn
+        """
+        x_range = max_x_value - min_x_value
+        y_range = max_y_value - min_y_value
+        values = {
+            'columns': tuple(columns),
+            'series': tuple((tuple(xs), tuple(ys)) for xs, ys in series),
+            'sizes': tuple(sizes),
+            'downsampling': downsampling,
+            'min_x_value': min_x_value,
+            'max_x_value': max_x_value,
+            'min_y_value': min_y_value,
+            'max_y_value': max_y_value,
+            'min_y': min_y,
+            'max_y': max_y,
+            'svg_width': svg_width,
+            'x_scale': svg_width / x_range if x_range else 0,
+            'y_scale': (max_y - min_y) / y_range if y_range else 0,
+        }
+        self._set_values(values)
+
+    def points(self, column):
+        """
+        Get drawn (x, y) points of a column
+        :param column:
+        :return:
+        """
+        xs, ys = self.series[self.columns.index(column)]
+        return tuple(zip(xs, ys))
+
+    def iter_pixels(self, index):
+        """
+        Iterate pixel coordinates of the drawn points of a column, the plot starts at x = 50
+        :param index: column index
+        :return: (x, y) for every point
+        """
+        xs, ys = self.series[index]
+        for x, y in zip(xs, ys):
+            yield (self.x_scale * (x - self.min_x_value) + 50,
+                   self.max_y - self.y_scale * (y - self.min_y_value))
+
+
+def compute_series(columns_data, x_data, min_x_value, max_x_value, min_y_value=None, max_y_value=None, min_y=None,
+                   max_y=None, svg_width=400, method=downsampling.LTTB, profile=None):
+    """
+    Compute a line or scatter chart from data and settings, every column is downsampled to svg_width points
+    :param columns_data: ordered list of (column, y values) pairs
+    :param x_data: x values shared by every column, None for points indexes
+    :param min_x_value: points with a lower x are not drawn
+    :param max_x_value: points with a higher x are not drawn
+    :param min_y_value: value drawn at the bottom of the plot, None for the lowest visible value
+    :param max_y_value: value drawn at the top of the plot, None for the highest visible value
+    :param min_y: top of the plot in pixels
+    :param max_y: bottom of the plot in pixels
+    :param svg_width:
+    :param method: downsampling.LTTB, downsampling.MIN_MAX or None to draw every point
+    :param profile: instrumentation.ChartProfile recording phases timings, if any
+    :return: SeriesResult
+    """
+    visible = list()
+    for column, data in columns_data:
+        data = data if data is not None else ()
+        xs = x_data if x_data is not None else range(len(data))
+        visible.append(downsampling.visible_points(xs, data, min_x_value, max_x_value))
+
+    with instrumentation.phase(profile, instrumentation.DOWNSAMPLING):
+        series = list()
+        for xs, ys in visible:
+            indexes = downsampling.downsample(xs, ys, svg_width, method) if method is not None else range(len(xs))
+            series.append(([float(xs[x]) for x in indexes], [float(ys[x]) for x in indexes]))
+
+    with instrumentation.phase(profile, instrumentation.SCALING):
+        if min_y_value is None or max_y_value is None:
+            y_bounds = [stats.bounds(ys) for _, ys in visible]
+            y_bounds = [x for x in y_bounds if x]
+            if y_bounds:
+                if min_y_value is None:
+                    min_y_value = min(x for x, _ in y_bounds)
+                if max_y_value is None:
+                    max_y_value = max(x for _, x in y_bounds)
+        return SeriesResult([column for column, _ in columns_data], series, [len(xs) for xs, _ in visible],
+                            min_x_value or 0, max_x_value or 0, min_y_value or 0, max_y_value or 0, min_y or 0,
+                            max_y or DEFAULT_MAX_Y, svg_width, method)
@@ -0,0 +1,180 @@
+"""
+Downsampling of line and scatter series.
+
+A series of millions of points is reduced to at most a threshold of points
+(the chart pixel width) before it is drawn, either with Largest Triangle Three
+Buckets (LTTB, keeps the visual shape of a line) or by keeping the lowest and
+highest point of every pixel column (MIN_MAX, keeps every peak). Functions
+return indexes of the kept points, in increasing order. When NumPy is
+installed the vectorized backend is used.
+"""
+import math
+
+from charts.backends import NUMPY, PYTHON, numpy, resolve_backend
+
+LTTB = 'lttb'
+MIN_MAX = 'min_max'
+METHODS = (LTTB, MIN_MAX)
+
+# backend used when none is given, None for NumPy when it is installed
+default_backend = None
+
+
+def _resolve_backend(backend):
+    return resolve_backend(backend, default_backend)
+
+
+def visible_points(xs, ys, min_x=None, max_x=None, backend=None):
+    """
+    Keep points with finite coordinates and min_x <= x <= max_x
+    :param xs:
+    :param ys:
+    :param min_x: None for no lower bound
+    :param max_x: None for no upper bound
+    :param backend: None for automatic selection, PYTHON or NUMPY
+    :return: (xs, ys) of the kept points
+    """
+    if len(xs) != len(ys):
+        raise ValueError('Series x and y values have different lengths: %d and %d' % (len(xs), len(ys)))
+    if _resolve_backend(backend) == NUMPY:
+        xs, ys = numpy.asarray(xs, dtype=float), numpy.asarray(ys, dtype=float)
+        mask = numpy.isfinite(xs) & numpy.isfinite(ys)
+        if min_x is not None:
+            mask &= xs >= min_x
+        if max_x is not None:
+            mask &= xs <= max_x
+        return xs[mask], ys[mask]
+    points = [(x, y) for x, y in zip(xs, ys) if math.isfinite(x) and math.isfinite(y)
+              and (min_x is None or x >= min_x) and (max_x is None or x <= max_x)]
+    return [x for x, _ in points], [y for _, y in points]
+
+
+def _python_lttb(xs, ys, threshold):
+    size = len(xs)
+    every = (size - 2) / (threshold - 2)
+    selected = 0
+    indexes = [0]
+    for bucket in range(threshold - 2):
+        # average point of the next bucket is the third point of the triangle
+        next_start = int((bucket + 1) * every) + 1
+        next_end = min(int((bucket + 2) * every) + 1, size)
+        average_x = sum(xs[next_start:next_end]) / (next_end - next_start)
+        average_y = sum(ys[next_start:next_end]) / (next_end - next_start)
+        selected_x, selected_y = xs[selected], ys[selected]
+        max_area = -1
+        for index in range(int(bucket * every) + 1, next_start):
+            area = abs((selected_x - average_x) * (ys[index] - selected_y) -
+                       (selected_x - xs[index]) * (average_y - selected_y))
+            if area > max_area:
+                max_area, next_selected = area, index
+        selected = next_selected
+        indexes.append(selected)
+    indexes.append(size - 1)
+    return indexes
+
+
+def _numpy_lttb(xs, ys, threshold):
+    xs, ys = numpy.asarray(xs, dtype=float), numpy.asarray(ys, dtype=float)
+    size = len(xs)
+    every = (size - 2) / (threshold - 2)
+    selected = 0
+    indexes = [0]
+    for bucket in range(threshold - 2):
+        next_start = int((bucket + 1) * every) + 1
+        next_end = min(int((bucket + 2) * every) + 1, size)
+        average_x = xs[next_start:next_end].mean()
+        average_y = ys[next_start:next_end].mean()
+        start = int(bucket * every) + 1
+        selected_x, selected_y = xs[selected], ys[selected]
+        areas = numpy.abs((selected_x - average_x) * (ys[start:next_start] - selected_y) -
+                          (selected_x - xs[start:next_start]) * (average_y - selected_y))
+        selected = start + int(areas.argmax())
+        indexes.append(selected)
+    indexes.append(size - 1)
+    return indexes
+
+
+def lttb(xs, ys, threshold, backend=None):
+    """
+    Select points with Largest Triangle Three Buckets: points are split in threshold - 2 buckets of equal size and
+    the point making the largest triangle with the previous selected point and the next bucket average is kept in
+    every bucket, with the first and last points.
+    :param xs: finite x values sorted in increasing order
+    :param ys: finite y values
+    :param threshold: maximum number of points
+    :param backend: None for automatic selection, PYTHON or NUMPY
+    :return: indexes of the kept points
+    """
+    size = len(xs)
+    if size <= threshold:
+        return list(range(size))
+    if threshold < 3:
+        return [0, size - 1][:max(threshold, 0)]
+    if _resolve_backend(backend) == NUMPY:
+        return _numpy_lttb(xs, ys, threshold)
+    return _python_lttb(xs, ys, threshold)
+
+
+def _python_min_max(xs, ys, columns):
+    min_x, max_x = min(xs), max(xs)
+    scale = columns / (max_x - min_x) if max_x > min_x else 0
+    lows = [None] * columns
+    highs = [None] * columns
+    for index, (x, y) in enumerate(zip(xs, ys)):
+        column = min(int((x - min_x) * scale), columns - 1)
+        low = lows[column]
+        if low is None:
+            lows[column] = highs[column] = index
+        elif y < ys[low]:
+            lows[column] = index
+        elif y >= ys[highs[column]]:
+            highs[column] = index
+    return sorted(set(x for x in lows + highs if x is not None))
+
+
+def _numpy_min_max(xs, ys, columns):
+    xs, ys = numpy.asarray(xs, dtype=float), numpy.asarray(ys, dtype=float)
+    min_x, max_x = xs.min(), xs.max()
+    scale = columns / (max_x - min_x) if max_x > min_x else 0
+    column = numpy.minimum(((xs - min_x) * scale).astype(numpy.intp), columns - 1)
+    # stable sort by column then y: first point of a column is its lowest, last is its highest
+    order = numpy.lexsort((ys, column))
+    sorted_column = column[order]
+    starts = numpy.flatnonzero(numpy.r_[True, sorted_column[1:] != sorted_column[:-1]])
+    ends = numpy.r_[starts[1:], len(order)] - 1
+    return numpy.unique(numpy.concatenate([order[starts], order[ends]])).tolist()
+
+
+def min_max(xs, ys, threshold, backend=None):
+    """
+    Select the lowest and highest point of every pixel column, threshold // 2 columns of equal width on the x range
+    :param xs: finite x values, in any order
+    :param ys: finite y values
+    :param threshold: maximum number of points
+    :param backend: None for automatic selection, PYTHON or NUMPY
+    :return: indexes of the kept points
+    """
+    size = len(xs)
+    if size <= threshold:
+        return list(range(size))
+    columns = max(threshold // 2, 1)
+    if _resolve_backend(backend) == NUMPY:
+        return _numpy_min_max(xs, ys, columns)
+    return _python_min_max(xs, ys, columns)
+
+
+def downsample(xs, ys, threshold, method=LTTB, backend=None):
+    """
+    Select at most threshold points of a series
+    :param xs: finite x values, sorted in increasing order for LTTB
+    :param ys: finite y values
+    :param threshold: maximum number of points
+    :param method: LTTB or MIN_MAX
+    :param backend: None for automatic selection, PYTHON or NUMPY
+    :return: indexes of the kept points
+    """
+    if method == LTTB:
+        return lttb(xs, ys, threshold, backend)
+    if method == MIN_MAX:
+        return min_max(xs, ys, threshold, backend)
+    raise ValueError('Unknown downsampling method: %r' % (method,))
@@ -0,0 +1,71 @@
+"""
+Executors running chart renders off the event loop (see ``Chart.ahtml_svg``).
+
+The default executor is read from the ``SIMPLE_CHARTS_EXECUTOR`` setting, ie::
+
+    SIMPLE_CHARTS_EXECUTOR = {
+        'KIND': 'process',    # 'thread' (default) or 'process'
+        'MAX_WORKERS': 4,     # None for the concurrent.futures default
+    }
+
+Threads share the charts and their caches but NumPy is the only part of a
+render releasing the GIL. Processes render in parallel, charts are pickled
+to the workers so their data must be picklable (ie. lists, array('d') or
+NumPy arrays, memory mapped columns are copied and querysets are sent as
+their query, see ``Histogram.__getstate__``) and workers run ``django.setup()``.
+Workers are started with ``parallel.start_method``, never forked from a
+(possibly threaded) web worker.
+"""
+import threading
+
+THREAD = 'thread'
+PROCESS = 'process'
+KINDS = (THREAD, PROCESS)
+
+
+def _setup_worker():
+    import django
+    django.setup()
+
+
+def create_executor(kind=THREAD, max_workers=None):
+    """
+    Create an executor for chart renders
+    :param kind: THREAD or PROCESS
+    :param max_workers: None for the concurrent.futures default
+    :return:
+    """
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+    if kind == THREAD:
+        return ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='charts')
+    if kind == PROCESS:
+        import multiprocessing
+
+        from charts import parallel
+        return ProcessPoolExecutor(max_workers=max_workers, initializer=_setup_worker,
+                                   mp_context=multiprocessing.get_context(parallel.start_method))
+    raise ValueError('Unknown executor kind: %r' % (kind,))
+
+
+def is_process_executor(executor):
+    from concurrent.futures import ProcessPoolExecutor
+    return isinstance(executor, ProcessPoolExecutor)
+
+
+_default_executor = None
+_default_executor_lock = threading.Lock()
+
+
+def get_default_executor():
+    """
+    Get the executor configured by SIMPLE_CHARTS_EXECUTOR setting
+    :return:
+    """
+    global _default_executor
+    if _default_executor is None:
+        with _default_executor_lock:
+            if _default_executor is None:
+                from django.conf import settings
+                options = getattr(settings, 'SIMPLE_CHARTS_EXECUTOR', {})
+                _default_executor = create_executor(options.get('KIND', THREAD), options.get('MAX_WORKERS'))
+    return _default_executor
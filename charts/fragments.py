@@ -0,0 +1,87 @@
+"""
+Fragment caching of charts markup for the ``{% chart %}`` template tag.
+
+Markup is stored in the cache used by Django ``{% cache %}`` tag (the
+``template_fragments`` alias when configured, else ``default``) under
+``make_template_fragment_key(FRAGMENT_NAME, [fingerprint])``, so fragments
+are shared by every page showing the same data and are invalidated with the
+usual Django helpers. Charts served by the SVG endpoint (see
+``views.ChartFragmentSvgView``) are stored in the same cache under their
+fingerprint until they are rendered once.
+"""
+from django.core.cache import InvalidCacheBackendError, caches
+from django.core.cache.utils import make_template_fragment_key
+from django.utils.safestring import mark_safe
+
+from charts.cache import DEFAULT_TIMEOUT
+
+FRAGMENT_NAME = 'simple_charts.chart'
+CHART_KEY_PREFIX = 'simple_charts.chart_object'
+
+
+def get_fragment_cache():
+    try:
+        return caches['template_fragments']
+    except InvalidCacheBackendError:
+        return caches['default']
+
+
+def get_fragment_key(fingerprint):
+    return make_template_fragment_key(FRAGMENT_NAME, [fingerprint])
+
+
+def _get_chart_key(fingerprint):
+    return '%s:%s' % (CHART_KEY_PREFIX, fingerprint)
+
+
+def render_fragment(chart, timeout=DEFAULT_TIMEOUT, fingerprint=None):
+    """
+    Get cached markup of a chart or render and store it
+    :param chart: Chart object
+    :param timeout: seconds before the fragment expires, None to never expire
+    :param fingerprint: chart fingerprint, computed when missing
+    :return:
+    """
+    fragment_cache = get_fragment_cache()
+    key = get_fragment_key(fingerprint or chart.fingerprint())
+    markup = fragment_cache.get(key)
+    if markup is None:
+        markup = chart.html_svg()
+        fragment_cache.set(key, str(markup), timeout)
+    return mark_safe(markup)
+
+
+def store_chart(chart, timeout=DEFAULT_TIMEOUT, fingerprint=None):
+    """
+    Keep a chart until it is rendered by the SVG endpoint, the chart is pickled so its data must be picklable
+    (memory mapped columns are copied, querysets are kept as their query and are not evaluated)
+    :param chart: Chart object
+    :param timeout: seconds before the chart (and its markup) expires, None to never expire
+    :param fingerprint: chart fingerprint, computed when missing
+    :return: fingerprint
+    """
+    fingerprint = fingerprint or chart.fingerprint()
+    fragment_cache = get_fragment_cache()
+    chart_key = _get_chart_key(fingerprint)
+    # the data is pickled once, not on every page showing the chart
+    if not fragment_cache.has_key(get_fragment_key(fingerprint)) and not fragment_cache.has_key(chart_key):
+        fragment_cache.set(chart_key, chart, timeout)
+    return fingerprint
+
+
+def render_stored_chart(fingerprint, timeout=DEFAULT_TIMEOUT):
+    """
+    Get markup of a chart kept by store_chart, rendered once
+    :param fingerprint:
+    :param timeout: seconds before the fragment expires, None to never expire
+    :return: None when the chart and its markup expired
+    """
+    fragment_cache = get_fragment_cache()
+    markup = fragment_cache.get(get_fragment_key(fingerprint))
+    if markup is None:
+        chart = fragment_cache.get(_get_chart_key(fingerprint))
+        if chart is None:
+            return None
+        markup = render_fragment(chart, timeout, fingerprint)
+        fragment_cache.delete(_get_chart_key(fingerprint))
+    return mark_safe(markup)
@@ -0,0 +1,124 @@
+"""
+Opt-in profiling of the chart pipeline.
+
+When enabled (``enable()``) or inside a collection (ie. a request handled by
+``middleware.ChartProfilingMiddleware``) every ``html_svg`` call records a
+ChartProfile with the time spent in each phase, the number of SVG elements
+and the output size, then sends the ``signals.chart_rendered`` signal.
+Disabled, a render only pays for a flag check and a shared null context.
+"""
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+
+ATTRIBUTES = 'attributes'
+BINNING = 'binning'
+DOWNSAMPLING = 'downsampling'
+SCALING = 'scaling'
+RENDERING = 'rendering'
+
+enabled = False
+
+_collection = ContextVar('charts_profiles_collection', default=None)
+_null_context = nullcontext()
+
+
+class ChartProfile(object):
+    """
+    Cost of a chart render
+    """
+
+    def __init__(self, chart):
+        self.chart = chart.__class__.__name__
+        self.phases = dict()
+        self.total = None
+        self.elements = None
+        self.output_bytes = None
+        self._started = time.perf_counter()
+
+    def add(self, phase, seconds):
+        self.phases[phase] = self.phases.get(phase, 0) + seconds
+
+    def __repr__(self):
+        return 'ChartProfile(chart=%r, total=%r, phases=%r, elements=%r, output_bytes=%r)' % (
+            self.chart, self.total, self.phases, self.elements, self.output_bytes)
+
+
+def enable():
+    global enabled
+    enabled = True
+
+
+def disable():
+    global enabled
+    enabled = False
+
+
+def start_profile(chart):
+    """
+    Start profiling a render
+    :param chart:
+    :return: ChartProfile, None when profiling is off
+    """
+    if enabled or _collection.get() is not None:
+        return ChartProfile(chart)
+
+
+@contextmanager
+def _timed_phase(profile, name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add(name, time.perf_counter() - start)
+
+
+def phase(profile, name):
+    """
+    Context manager timing a phase of a profiled render
+    :param profile: ChartProfile or None
+    :param name: ATTRIBUTES, BINNING, DOWNSAMPLING, SCALING or RENDERING
+    :return:
+    """
+    if profile is None:
+        return _null_context
+    return _timed_phase(profile, name)
+
+
+def finish_profile(profile, chart, markup):
+    """
+    Complete a profile with output measures, collect it and send signals.chart_rendered
+    :param profile: ChartProfile or None
+    :param chart:
+    :param markup: rendered markup
+    :return:
+    """
+    if profile is None:
+        return
+    profile.total = time.perf_counter() - profile._started
+    profile.elements = markup.count('<') - markup.count('</')
+    profile.output_bytes = len(markup.encode())
+    collection = _collection.get()
+    if collection is not None:
+        collection.append(profile)
+    from charts.signals import chart_rendered
+    chart_rendered.send(sender=chart.__class__, chart=chart, profile=profile)
+
+
+def begin_collection():
+    """
+    Collect profiles of every render in the current context
+    :return: token for end_collection
+    """
+    return _collection.set(list())
+
+
+def end_collection(token):
+    """
+    Stop collecting profiles
+    :param token: begin_collection token
+    :return: collected profiles
+    """
+    profiles = _collection.get()
+    _collection.reset(token)
+    return profiles
@@ -0,0 +1,57 @@
+"""
+Lazy imports of optional dependencies.
+
+``optional_module('numpy')`` replaces the usual::
+
+    try:
+        import numpy
+    except ImportError:
+        numpy = None
+
+it only checks that the module is installed and imports it on the first
+attribute access, so importing charts does not pay for NumPy in processes
+never drawing a chart (workers startup, management commands).
+"""
+import importlib
+import importlib.util
+import threading
+
+
+class LazyModule(object):
+    """
+    Proxy of a module imported on first attribute access
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return '<lazy module %r%s>' % (self._name, '' if self._module is None else ' (imported)')
+
+    @property
+    def is_imported(self):
+        return self._module is not None
+
+    def _import(self):
+        with self._lock:
+            if self._module is None:
+                self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attribute):
+        # only called for attributes missing on the proxy
+        module = self._module if self._module is not None else self._import()
+        return getattr(module, attribute)
+
+
+def optional_module(name):
+    """
+    Get a lazily imported module
+    :param name: top level module name, ie. 'numpy'
+    :return: LazyModule, None when the module is not installed
+    """
+    if importlib.util.find_spec(name) is None:
+        return None
+    return LazyModule(name)
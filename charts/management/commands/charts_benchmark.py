@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from charts import benchmarks
+
+
+class Command(BaseCommand):
+    help = 'Benchmark Histogram compute and render paths, results are written as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+                            help='number of values of every column (10^3 to 10^7)')
+        parser.add_argument('--breaks', type=int, nargs='+', default=[10, 200],
+                            help='number of bins, 0 for the Freedman-Diaconis width')
+        parser.add_argument('--columns', type=int, nargs='+', default=[1], help='number of columns')
+        parser.add_argument('--distributions', nargs='+', default=list(benchmarks.DISTRIBUTIONS),
+                            choices=benchmarks.DISTRIBUTIONS)
+        parser.add_argument('--backends', nargs='+', default=['auto'], choices=['auto', 'python', 'numpy'])
+        parser.add_argument('--repeat', type=int, default=3, help='number of timed runs, the best is kept')
+        parser.add_argument('--no-memory', action='store_true', help='skip tracemalloc peak memory measures')
+        parser.add_argument('--output', help='JSON file path, standard output when missing')
+
+    def handle(self, *args, **options):
+        results = benchmarks.run(sizes=options['sizes'],
+                                 breaks=[x or None for x in options['breaks']],
+                                 columns=options['columns'],
+                                 distributions=options['distributions'],
+                                 backends=[None if x == 'auto' else x for x in options['backends']],
+                                 repeat=options['repeat'],
+                                 memory=not options['no_memory'])
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                output.write(benchmarks.dumps(results))
+        else:
+            self.stdout.write(benchmarks.dumps(results))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from charts.models import ChartSnapshot
+from charts.snapshots import refresh_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Count rows added since the last refresh into chart snapshots'
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', help='snapshots names, every snapshot when missing')
+        parser.add_argument('--rebuild', action='store_true',
+                            help='count every row again, needed when rows were updated or deleted')
+
+    def handle(self, *args, **options):
+        snapshots = ChartSnapshot.objects.order_by('name')
+        if options['names']:
+            snapshots = snapshots.filter(name__in=options['names'])
+            missing = set(options['names']) - set(x.name for x in snapshots)
+            if missing:
+                raise CommandError('Unknown snapshots: %s' % ', '.join(sorted(missing)))
+        for snapshot in snapshots:
+            if refresh_snapshot(snapshot, rebuild=options['rebuild']):
+                self.stdout.write('%s refreshed up to pk %s' % (snapshot.name, snapshot.last_pk))
+            else:
+                self.stdout.write('%s is up to date' % snapshot.name)
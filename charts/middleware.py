@@ -0,0 +1,57 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from charts import instrumentation
+
+
+class ChartProfilingMiddleware(object):
+    """
+    Profile charts rendered while handling a request. Profiles are set on request.chart_profiles
+    and their cost is reported in a Server-Timing header. Streamed charts are rendered after the
+    response is returned and are not measured, neither are charts rendered in a process executor
+    (see charts.executors): their profiles stay in the worker process.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = instrumentation.begin_collection()
+        try:
+            response = self.get_response(request)
+        finally:
+            request.chart_profiles = instrumentation.end_collection(token)
+        return self.add_server_timing(request, response)
+
+    async def __acall__(self, request):
+        token = instrumentation.begin_collection()
+        try:
+            response = await self.get_response(request)
+        finally:
+            request.chart_profiles = instrumentation.end_collection(token)
+        return self.add_server_timing(request, response)
+
+    def add_server_timing(self, request, response):
+        if request.chart_profiles:
+            response['Server-Timing'] = self.get_server_timing(request.chart_profiles)
+        return response
+
+    @staticmethod
+    def get_server_timing(profiles):
+        """
+        Get Server-Timing header value of chart profiles
+        :param profiles:
+        :return:
+        """
+        phases = dict()
+        for profile in profiles:
+            for name, seconds in profile.phases.items():
+                phases[name] = phases.get(name, 0) + seconds
+        metrics = ['charts;dur=%.3f;desc="%d charts"' % (sum(x.total for x in profiles) * 1000, len(profiles))]
+        metrics.extend('charts-%s;dur=%.3f' % (name, seconds * 1000) for name, seconds in phases.items())
+        return ', '.join(metrics)
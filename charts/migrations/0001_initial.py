@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChartSnapshot',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.SlugField(unique=True)),
+                ('model', models.CharField(help_text='label of the source model, ie. "auth.User"', max_length=200)),
+                ('columns', models.TextField(help_text='JSON list of the aggregated field names')),
+                ('breaks', models.PositiveIntegerField(blank=True, help_text='number of uniform bins, empty for the Freedman-Diaconis width', null=True)),
+                ('fixed_edges', models.BooleanField(default=False, help_text='keep edges when the snapshot is rebuilt')),
+                ('edges', models.BinaryField(blank=True, default=b'')),
+                ('counts', models.BinaryField(blank=True, default=b'')),
+                ('summaries', models.TextField(blank=True, default='{}')),
+                ('last_pk', models.BigIntegerField(blank=True, help_text='highest primary key of the counted rows', null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -1,3 +1,107 @@
+import json
+import sys
+from array import array
+
+from django.apps import apps
 from django.db import models
 
-# Create your models here.
+from charts import stats
+
+
+def _pack(typecode, values):
+    """
+    Pack numbers as little endian bytes
+    :param typecode: array typecode
+    :param values:
+    :return:
+    """
+    packed = array(typecode, values)
+    if sys.byteorder == 'big':
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def _unpack(typecode, data):
+    """
+    Unpack little endian bytes
+    :param typecode: array typecode
+    :param data: bytes or memoryview
+    :return:
+    """
+    unpacked = array(typecode)
+    unpacked.frombytes(bytes(data or b''))
+    if sys.byteorder == 'big':
+        unpacked.byteswap()
+    return unpacked
+
+
+class ChartSnapshot(models.Model):
+    """
+    Precomputed histogram of model rows: bins edges, counts of every column and summaries, see charts.snapshots.
+    Edges are packed doubles and counts packed 64 bits integers (one row of counts for each column).
+    """
+    name = models.SlugField(unique=True)
+    model = models.CharField(max_length=200, help_text='label of the source model, ie. "auth.User"')
+    columns = models.TextField(help_text='JSON list of the aggregated field names')
+    breaks = models.PositiveIntegerField(null=True, blank=True,
+                                         help_text='number of uniform bins, empty for the Freedman-Diaconis width')
+    fixed_edges = models.BooleanField(default=False, help_text='keep edges when the snapshot is rebuilt')
+    edges = models.BinaryField(default=b'', blank=True)
+    counts = models.BinaryField(default=b'', blank=True)
+    summaries = models.TextField(default='{}', blank=True)
+    last_pk = models.BigIntegerField(null=True, blank=True, help_text='highest primary key of the counted rows')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.name
+
+    def get_queryset(self):
+        """
+        Get rows of the source model
+        :return:
+        """
+        return apps.get_model(self.model)._default_manager.all()
+
+    def get_columns(self):
+        return json.loads(self.columns)
+
+    def set_columns(self, columns):
+        self.columns = json.dumps(list(columns))
+
+    def get_edges(self):
+        return _unpack('d', self.edges).tolist()
+
+    def set_edges(self, edges):
+        self.edges = _pack('d', edges)
+
+    def get_counts(self):
+        """
+        Get counts of every bin for every column
+        :return: dictionary of column to counts
+        """
+        counts = _unpack('q', self.counts).tolist()
+        breaks = max(len(self.get_edges()) - 1, 0)
+        return {column: counts[index * breaks:(index + 1) * breaks] for index, column in enumerate(self.get_columns())}
+
+    def set_counts(self, counts):
+        """
+        :param counts: dictionary of column to counts
+        :return:
+        """
+        self.counts = _pack('q', [x for column in self.get_columns() for x in counts[column]])
+
+    def get_summaries(self):
+        """
+        Get min, quartiles and max of every column
+        :return: dictionary of column to stats.Summary (None for a column without value)
+        """
+        return {column: stats.Summary(*values) if values else None
+                for column, values in json.loads(self.summaries).items()}
+
+    def set_summaries(self, summaries):
+        """
+        :param summaries: dictionary of column to stats.Summary
+        :return:
+        """
+        self.summaries = json.dumps({column: [x.count, x.min, x.q1, x.median, x.q3, x.max] if x else None
+                                     for column, x in summaries.items()})
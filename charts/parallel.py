@@ -0,0 +1,162 @@
+"""
+Parallel binning of large columns in a process pool.
+
+Every column is copied once into a ``multiprocessing.shared_memory`` block of
+doubles, split into shards and each shard is binned by a worker process with
+the serial binning functions, so counts are identical to the serial mode.
+Workers only receive the block name and the shard bounds and return a count
+vector, partial counts are summed at the end. They are started with
+``start_method``, never forked from a (possibly threaded) web worker.
+"""
+import atexit
+import math
+import os
+import sys
+import threading
+from array import array
+
+from charts import binning
+from charts.lazy import optional_module
+
+numpy = optional_module('numpy')
+
+# total number of values above which histograms are binned in parallel, when not forced
+threshold = 4000000
+
+# values binned by a worker at once, at least
+min_shard_size = 500000
+
+# workers are not forked, forking a multithreaded web worker may deadlock
+start_method = 'forkserver' if sys.platform != 'win32' else 'spawn'
+
+_DOUBLE_SIZE = array('d').itemsize
+
+_pool = None
+_pool_workers = None
+_pool_lock = threading.Lock()
+
+
+def get_workers():
+    return os.cpu_count() or 1
+
+
+def is_worth(columns):
+    """
+    Check if columns are large enough to be binned in parallel
+    :param columns: list of columns data
+    :return:
+    """
+    return get_workers() > 1 and sum(len(x) for x in columns if x is not None) >= threshold
+
+
+def _get_pool(workers):
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown()
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(start_method))
+            _pool_workers = workers
+        return _pool
+
+
+@atexit.register
+def shutdown():
+    """
+    Stop worker processes, they are started again when needed
+    :return:
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
+
+
+def _share_column(data):
+    """
+    Copy a column into a new shared memory block of doubles
+    :param data:
+    :return: SharedMemory, the caller unlinks it
+    """
+    from multiprocessing import shared_memory
+    block = shared_memory.SharedMemory(create=True, size=max(len(data), 1) * _DOUBLE_SIZE)
+    try:
+        if numpy is not None:
+            numpy.ndarray((len(data),), dtype=float, buffer=block.buf)[:] = numpy.asarray(data, dtype=float)
+        else:
+            view = block.buf[:len(data) * _DOUBLE_SIZE].cast('d')
+            view[:] = data if isinstance(data, array) and data.typecode == 'd' else array('d', data)
+            view.release()
+    except BaseException:
+        block.close()
+        block.unlink()
+        raise
+    return block
+
+
+def _count_shard(name, start, stop, min_value, width, breaks, edges, backend):
+    """
+    Bin a shard of a shared column, in a worker process
+    :return: counts
+    """
+    from multiprocessing import shared_memory
+    block = shared_memory.SharedMemory(name=name)
+    view = block.buf[start * _DOUBLE_SIZE:stop * _DOUBLE_SIZE].cast('d')
+    try:
+        if edges:
+            return binning.count_edges(view, edges, backend)
+        return binning.count_uniform(view, min_value, width, breaks, backend)
+    finally:
+        view.release()
+        block.close()
+
+
+def count_matrix(columns, min_value=None, width=None, breaks=None, edges=None, backend=None, workers=None):
+    """
+    Count values of every column in uniform bins (min_value, width, breaks) or bins delimited by sorted edges,
+    in parallel. Results are those of binning.count_uniform_matrix and binning.count_edges_matrix.
+    :param columns: list of columns data, None for a column without data
+    :param min_value: lower bound of the first uniform bin
+    :param width: uniform bins width
+    :param breaks: number of uniform bins
+    :param edges: sorted bins edges, they take precedence over uniform bins
+    :param backend: None for automatic selection, binning.PYTHON or binning.NUMPY
+    :param workers: number of processes, None for the number of CPUs
+    :return: list of counts for every column
+    """
+    if edges:
+        binning._check_edges(edges)
+        breaks = len(edges) - 1
+    backend = binning._select_backend(backend)
+    workers = workers or get_workers()
+    pool = _get_pool(workers)
+    blocks = list()
+    futures = list()
+    try:
+        for data in columns:
+            size = len(data) if data is not None else 0
+            column_futures = list()
+            if size and (edges or (breaks and width and width > 0)):
+                block = _share_column(data)
+                blocks.append(block)
+                shard_size = max(math.ceil(size / workers), min_shard_size)
+                for start in range(0, size, shard_size):
+                    column_futures.append(pool.submit(_count_shard, block.name, start, min(start + shard_size, size),
+                                                      min_value, width, breaks, edges, backend))
+            futures.append(column_futures)
+        matrix = list()
+        for column_futures in futures:
+            counts = [0] * (breaks or 0)
+            for future in column_futures:
+                counts = [x + y for x, y in zip(counts, future.result())]
+            matrix.append(counts)
+        return matrix
+    finally:
+        for future in (x for column_futures in futures for x in column_futures):
+            future.cancel()
+        for block in blocks:
+            block.close()
+            block.unlink()
@@ -0,0 +1,157 @@
+"""
+Database side aggregation for charts built from a Django QuerySet.
+
+Min/max are aggregated, quartiles are read with ordered OFFSET queries and
+bins are counted with a GROUP BY over a computed bucket, so only O(bins)
+rows come back from the database. Columns are field names of the queryset.
+Values are returned as floats, as columns data, so DecimalField values mix
+with the computations of the other columns.
+"""
+from django.db.models import Case, Count, ExpressionWrapper, F, FloatField, IntegerField, Max, Min, Q, Value, When
+from django.db.models.functions import Floor
+
+from charts import stats
+
+_BUCKET = 'chart_bucket'
+_SHIFT = 'chart_shift'
+_COUNT = 'chart_count'
+
+
+def _values(queryset, field):
+    """
+    Get a values queryset of the non null values of a field without default ordering
+    :param queryset:
+    :param field:
+    :return:
+    """
+    return queryset.filter(**{'%s__isnull' % field: False}).order_by().values_list(field, flat=True)
+
+
+def iter_values(queryset, field):
+    """
+    Iterate non null values of a field as floats, fetched in chunks
+    :param queryset:
+    :param field:
+    :return:
+    """
+    return map(float, _values(queryset, field).iterator())
+
+
+def _ordered_values(queryset, fields):
+    """
+    Get values of one or more fields (in one column) ordered by value
+    :param queryset:
+    :param fields:
+    :return:
+    """
+    ordered = _values(queryset, fields[0])
+    if len(fields) > 1:
+        ordered = ordered.union(*[_values(queryset, x) for x in fields[1:]], all=True)
+    return ordered.order_by(fields[0])
+
+
+def bounds(queryset, fields):
+    """
+    Count non null values of one or more fields together and get their min and max, in one aggregate query
+    :param queryset:
+    :param fields: field name or list of field names
+    :return: (count, min, max) with float min and max, None when there is no value
+    """
+    if isinstance(fields, str):
+        fields = [fields]
+    aggregates = dict()
+    for index, field in enumerate(fields):
+        aggregates['min_%d' % index] = Min(field)
+        aggregates['max_%d' % index] = Max(field)
+        aggregates['count_%d' % index] = Count(field)
+    result = queryset.order_by().aggregate(**aggregates)
+    size = sum(result['count_%d' % x] for x in range(len(fields)))
+    if not size:
+        return None
+    minimums = [result['min_%d' % x] for x in range(len(fields)) if result['min_%d' % x] is not None]
+    maximums = [result['max_%d' % x] for x in range(len(fields)) if result['max_%d' % x] is not None]
+    return size, float(min(minimums)), float(max(maximums))
+
+
+def version(queryset):
+    """
+    Get a cheap version of queryset rows, it changes when rows are added or deleted (not when they are updated)
+    :param queryset:
+    :return: (count, max primary key)
+    """
+    result = queryset.order_by().aggregate(count=Count('pk'), last_pk=Max('pk'))
+    return result['count'], result['last_pk']
+
+
+def describe(queryset, fields):
+    """
+    Compute min, quartiles and max of one or more fields together in the database
+    :param queryset:
+    :param fields: field name or list of field names
+    :return: stats.Summary or None when there is no value
+    """
+    if isinstance(fields, str):
+        fields = [fields]
+    aggregated = bounds(queryset, fields)
+    if aggregated is None:
+        return None
+    size, min_value, max_value = aggregated
+    ordered = _ordered_values(queryset, fields)
+    quartiles = [float(ordered[stats.quantile_rank(size, r)]) for r in (0.25, 0.5, 0.75)]
+    return stats.Summary(size, min_value, quartiles[0], quartiles[1], quartiles[2], max_value)
+
+
+def _collect_counts(rows, breaks):
+    counts = [0] * breaks
+    for row in rows:
+        # the bucket is a float or a Decimal (ie. Floor of a DecimalField on some databases)
+        index = int(row[_BUCKET]) + row.get(_SHIFT, 0)
+        if 0 <= index < breaks:
+            counts[index] += row[_COUNT]
+    return counts
+
+
+def count_uniform(queryset, field, min_value, width, breaks):
+    """
+    Count values of a field in every uniform bin with a GROUP BY on Floor((field - min) / width)
+    :param queryset:
+    :param field:
+    :param min_value: lower bound of the first bin
+    :param width: bins width
+    :param breaks: number of bins
+    :return: list of counts, one for each bin
+    """
+    if not breaks:
+        return list()
+    if not width > 0:
+        return [0] * breaks
+    lower_bound, upper_bound = min_value, min_value + (breaks - 1) * width + width
+    min_value, width = Value(float(min_value)), Value(float(width))
+    bucket = Floor(ExpressionWrapper((F(field) - min_value) / width, output_field=FloatField()))
+    # Floor of the division can be one bin off near the bins bounds because of rounding, the
+    # bucket is shifted where the value fails the exact min <= x < max comparisons of its bin.
+    lower = ExpressionWrapper(min_value + F(_BUCKET) * width, output_field=FloatField())
+    upper = ExpressionWrapper(min_value + F(_BUCKET) * width + width, output_field=FloatField())
+    shift = Case(When(Q(**{'%s__lt' % field: lower}), then=Value(-1)),
+                 When(Q(**{'%s__gte' % field: upper}), then=Value(1)),
+                 default=Value(0), output_field=IntegerField())
+    rows = queryset.filter(**{'%s__gte' % field: lower_bound, '%s__lt' % field: upper_bound}).order_by() \
+        .annotate(**{_BUCKET: bucket}).annotate(**{_SHIFT: shift}) \
+        .values(_BUCKET, _SHIFT).annotate(**{_COUNT: Count('*')})
+    return _collect_counts(rows, breaks)
+
+
+def count_edges(queryset, field, edges):
+    """
+    Count values of a field in every bin delimited by sorted edges with a GROUP BY on a Case/When bucket
+    :param queryset:
+    :param field:
+    :param edges: strictly increasing bins edges, n + 1 edges for n bins
+    :return: list of counts, one for each bin
+    """
+    breaks = len(edges) - 1
+    bucket = Case(*[When(Q(**{'%s__lt' % field: edge}), then=Value(index)) for index, edge in enumerate(edges[1:])],
+                  output_field=IntegerField())
+    rows = queryset.filter(**{'%s__gte' % field: edges[0], '%s__lt' % field: edges[-1]}).order_by() \
+        .annotate(**{_BUCKET: bucket}).values(_BUCKET).annotate(**{_COUNT: Count('*')})
+    return _collect_counts(rows, breaks)
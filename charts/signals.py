@@ -0,0 +1,4 @@
+from django.dispatch import Signal
+
+# sent with chart and profile (instrumentation.ChartProfile) arguments after a profiled render
+chart_rendered = Signal()
@@ -0,0 +1,266 @@
+"""
+Mergeable quantile sketches for approximate histograms.
+
+A KLLSketch keeps a bounded sample of a column in one pass: values enter the
+first level of a stack of compactors and a full level is sorted and half of
+its values (every other value, from a random offset) are promoted to the
+next level with a doubled weight. Memory is O(k log(n / k)), count, min and
+max are exact and the rank error of quantiles and bin counts shrinks as
+1 / k (about 1% of the count for the default k = 200). Sketches of
+partitions built on different workers or days are merged into one, and are
+serialized as compact bytes.
+"""
+import math
+import random
+import struct
+from bisect import bisect_left, bisect_right
+from itertools import accumulate, islice
+
+from charts import binning, stats
+
+DEFAULT_K = 200
+
+# values added to the first level at once, at least
+_CHUNK_SIZE = 4096
+
+_MAGIC = b'KLL1'
+# magic, k, number of levels, count, min, max
+_HEADER = struct.Struct('<4sHHQdd')
+
+
+class KLLSketch(object):
+    """
+    KLL quantile sketch
+    """
+
+    def __init__(self, k=DEFAULT_K, seed=0):
+        """
+        :param k: size of the largest compactor, the rank error shrinks as 1 / k
+        :param seed: seed of the random offsets of compactions, sketches built from the same data are the same
+        """
+        if not 8 <= k < 2 ** 16:
+            raise ValueError('Sketch k must be between 8 and 65535: %r' % (k,))
+        self.k = k
+        self.count = 0
+        self.min = None
+        self.max = None
+        self.compactors = [[]]
+        self._random = random.Random(seed)
+
+    def __repr__(self):
+        return 'KLLSketch(k=%r, count=%r, min=%r, max=%r, size=%r)' % (self.k, self.count, self.min, self.max,
+                                                                      self.size)
+
+    @property
+    def size(self):
+        """
+        Number of kept values
+        :return:
+        """
+        return sum(len(x) for x in self.compactors)
+
+    def _capacity(self, level):
+        depth = len(self.compactors) - level - 1
+        return max(int(math.ceil(self.k * (2 / 3) ** depth)), 2)
+
+    def _max_size(self):
+        return sum(self._capacity(x) for x in range(len(self.compactors)))
+
+    def _compress(self):
+        """
+        Compact full levels until the kept values fit in the sketch
+        :return:
+        """
+        while self.size >= self._max_size():
+            capacities = [self._capacity(x) for x in range(len(self.compactors))]
+            for level, capacity in enumerate(capacities):
+                items = self.compactors[level]
+                if len(items) >= capacity:
+                    if level + 1 == len(self.compactors):
+                        self.compactors.append([])
+                    items.sort()
+                    # an odd value out stays at this level, the weight of the sketch is unchanged
+                    kept = [items.pop()] if len(items) % 2 else []
+                    self.compactors[level + 1].extend(items[self._random.randint(0, 1)::2])
+                    self.compactors[level] = kept
+                    break
+
+    def update(self, values):
+        """
+        Add values, NaN are ignored
+        :param values: iterable of numbers
+        :return: self
+        """
+        iterator = iter(values)
+        while True:
+            # a first level larger than its capacity only makes compactions more accurate
+            chunk = list(islice(iterator, max(self._max_size() - self.size, _CHUNK_SIZE)))
+            if not chunk:
+                return self
+            chunk = [float(x) for x in chunk if x == x]
+            if chunk:
+                self.count += len(chunk)
+                chunk_min, chunk_max = min(chunk), max(chunk)
+                self.min = chunk_min if self.min is None else min(self.min, chunk_min)
+                self.max = chunk_max if self.max is None else max(self.max, chunk_max)
+                self.compactors[0].extend(chunk)
+                self._compress()
+
+    def merge(self, other):
+        """
+        Add values summarized by another sketch
+        :param other: KLLSketch
+        :return: self
+        """
+        while len(self.compactors) < len(other.compactors):
+            self.compactors.append([])
+        for level, items in enumerate(other.compactors):
+            self.compactors[level].extend(items)
+        self.count += other.count
+        for value in (other.min, other.max):
+            if value is not None:
+                self.min = value if self.min is None else min(self.min, value)
+                self.max = value if self.max is None else max(self.max, value)
+        self._compress()
+        return self
+
+    def copy(self):
+        return self.from_bytes(self.to_bytes())
+
+    def _get_cumulative_weights(self):
+        """
+        Get kept values in sorted order and the total weight of the values before each of them
+        :return: (values, weights), weights has one more item, the count
+        """
+        weighted = sorted((value, 2 ** level) for level, items in enumerate(self.compactors) for value in items)
+        values = [x for x, _ in weighted]
+        return values, [0] + list(accumulate(x for _, x in weighted))
+
+    def rank(self, value):
+        """
+        Get the approximate number of values lower than a value
+        :param value:
+        :return:
+        """
+        values, weights = self._get_cumulative_weights()
+        return weights[bisect_left(values, value)]
+
+    def select(self, ranks):
+        """
+        Get approximate values at ranks of the sorted values
+        :param ranks: indexes in sorted order
+        :return: dictionary of rank to value
+        """
+        values, weights = self._get_cumulative_weights()
+        selected = dict()
+        for rank in ranks:
+            index = min(bisect_right(weights, rank) - 1, len(values) - 1)
+            selected[rank] = min(max(values[index], self.min), self.max)
+        return selected
+
+    def quantile(self, r):
+        """
+        Get approximate quantile for r proportion (ie. 0.25 for Q1 and 0.5 for median)
+        :param r:
+        :return: None for an empty sketch
+        """
+        if self.count:
+            rank = stats.quantile_rank(self.count, r)
+            return self.select([rank])[rank]
+
+    def describe(self):
+        """
+        Get exact count, min and max and approximate quartiles
+        :return: stats.Summary or None for an empty sketch
+        """
+        if not self.count:
+            return None
+        ranks = [stats.quantile_rank(self.count, r) for r in (0.25, 0.5, 0.75)]
+        selected = self.select(ranks)
+        return stats.Summary(self.count, self.min, selected[ranks[0]], selected[ranks[1]], selected[ranks[2]],
+                             self.max)
+
+    def count_edges(self, edges):
+        """
+        Get approximate counts of values in every bin delimited by sorted edges, from differences of ranks
+        :param edges: strictly increasing bins edges, n + 1 edges for n bins
+        :return: list of counts, one for each bin
+        """
+        values, weights = self._get_cumulative_weights()
+        ranks = [weights[bisect_left(values, x)] for x in edges]
+        return [high - low for low, high in zip(ranks, ranks[1:])]
+
+    def count_uniform(self, min_value, width, breaks):
+        """
+        Get approximate counts of values in every bin of a uniform histogram
+        :param min_value: lower bound of the first bin
+        :param width: bins width
+        :param breaks: number of bins
+        :return: list of counts, one for each bin
+        """
+        if not breaks:
+            return list()
+        if not width > 0:
+            return [0] * breaks
+        ranges = binning.uniform_bin_ranges(min_value, width, breaks)
+        return self.count_edges([low for low, _ in ranges] + [ranges[-1][1]])
+
+    def to_bytes(self):
+        """
+        Serialize the sketch (little endian)
+        :return:
+        """
+        nan = float('nan')
+        header = _HEADER.pack(_MAGIC, self.k, len(self.compactors), self.count,
+                              nan if self.min is None else self.min, nan if self.max is None else self.max)
+        lengths = struct.pack('<%dI' % len(self.compactors), *[len(x) for x in self.compactors])
+        values = [x for items in self.compactors for x in items]
+        return header + lengths + struct.pack('<%dd' % len(values), *values)
+
+    @classmethod
+    def from_bytes(cls, data, seed=0):
+        """
+        Deserialize a sketch
+        :param data: bytes of KLLSketch.to_bytes
+        :param seed: seed of the random offsets of next compactions
+        :return:
+        """
+        data = bytes(data)
+        magic, k, levels, count, min_value, max_value = _HEADER.unpack_from(data)
+        if magic != _MAGIC:
+            raise ValueError('Not a serialized KLL sketch')
+        sketch = cls(k, seed)
+        sketch.count = count
+        sketch.min = None if min_value != min_value else min_value
+        sketch.max = None if max_value != max_value else max_value
+        offset = _HEADER.size
+        lengths = struct.unpack_from('<%dI' % levels, data, offset)
+        offset += 4 * levels
+        values = struct.unpack_from('<%dd' % sum(lengths), data, offset)
+        sketch.compactors = list()
+        for length in lengths:
+            sketch.compactors.append(list(values[:length]))
+            values = values[length:]
+        return sketch
+
+
+def sketch_column(data, k=DEFAULT_K):
+    """
+    Build the sketch of a column in one pass
+    :param data: iterable of numbers
+    :param k:
+    :return: KLLSketch
+    """
+    return KLLSketch(k).update(data)
+
+
+def merge_sketches(sketches):
+    """
+    Merge sketches into a new one
+    :param sketches: list of KLLSketch
+    :return: KLLSketch, None when the list is empty
+    """
+    merged = None
+    for sketch in sketches:
+        merged = sketch.copy() if merged is None else merged.merge(sketch)
+    return merged
@@ -0,0 +1,109 @@
+"""
+Refresh of precomputed histogram snapshots (models.ChartSnapshot).
+
+Summaries and counts are aggregated in the database with charts.querysets,
+raw rows are never fetched. Rows are expected to be appended: a refresh only
+counts rows with a primary key above the snapshot ``last_pk`` and adds their
+counts to the stored ones. Edges derived from the data are recomputed (and
+every row counted again) when new rows widen the data range, updated or
+deleted rows need a rebuild. Counts, min and max of the stored summaries are
+merged with those of the new rows, quartiles are those of the last rebuild.
+"""
+from django.db import transaction
+from django.db.models import Max
+
+from charts import querysets, stats
+from charts.computation import get_histogram_bins
+
+
+def get_edges(summary, breaks=None):
+    """
+    Get edges of uniform bins covering a summary range
+    :param summary: stats.Summary of all columns together
+    :param breaks: number of bins, None for the Freedman-Diaconis width
+    :return:
+    """
+    if summary is None:
+        return list()
+    bins_width, bin_ranges = get_histogram_bins(summary.min, summary.max, breaks, None, summary)
+    if not bins_width or not bin_ranges:
+        # a single value (or no spread): one bin of width 1
+        return [summary.min, summary.min + 1]
+    return [low for low, _ in bin_ranges] + [bin_ranges[-1][1]]
+
+
+def _is_widened(snapshot, new_bounds):
+    """
+    Check if new values are out of the range of the snapshot values
+    :param snapshot:
+    :param new_bounds: (count, min, max) of new values
+    :return:
+    """
+    summaries = [x for x in snapshot.get_summaries().values() if x]
+    if not summaries:
+        return True
+    _, min_value, max_value = new_bounds
+    return min_value < min(x.min for x in summaries) or max_value > max(x.max for x in summaries)
+
+
+def _merge_summary(summary, new_rows, column):
+    """
+    Add count, min and max of new rows to a stored summary, quartiles are kept
+    :param summary: stats.Summary of the counted rows, None when they have no value
+    :param new_rows: queryset of the rows added since
+    :param column:
+    :return:
+    """
+    if summary is None:
+        return querysets.describe(new_rows, column)
+    new_bounds = querysets.bounds(new_rows, column)
+    if new_bounds is None:
+        return summary
+    count, min_value, max_value = new_bounds
+    return stats.Summary(summary.count + count, min(summary.min, min_value), summary.q1, summary.median, summary.q3,
+                         max(summary.max, max_value))
+
+
+def refresh_snapshot(snapshot, rebuild=False):
+    """
+    Count rows added since the last refresh, or every row on the first refresh or a rebuild, and save the snapshot
+    :param snapshot: models.ChartSnapshot
+    :param rebuild: count every row again
+    :return: True when the snapshot changed
+    """
+    columns = snapshot.get_columns()
+    with transaction.atomic():
+        last_pk = snapshot.get_queryset().order_by().aggregate(last_pk=Max('pk'))['last_pk']
+        if last_pk is None:
+            return False
+        queryset = snapshot.get_queryset().filter(pk__lte=last_pk)
+        if snapshot.last_pk is not None and not rebuild:
+            if last_pk <= snapshot.last_pk:
+                return False
+            new_rows = queryset.filter(pk__gt=snapshot.last_pk)
+            new_bounds = querysets.bounds(new_rows, columns)
+            rebuild = new_bounds is not None and not snapshot.fixed_edges and _is_widened(snapshot, new_bounds)
+        else:
+            rebuild = True
+
+        if rebuild:
+            new_rows = queryset
+            if not snapshot.fixed_edges:
+                snapshot.set_edges(get_edges(querysets.describe(queryset, columns), snapshot.breaks))
+        edges = snapshot.get_edges()
+        counts = snapshot.get_counts()
+        for column in columns:
+            column_counts = querysets.count_edges(new_rows, column, edges) if len(edges) > 1 else []
+            if not rebuild and len(counts[column]) == len(column_counts):
+                column_counts = [x + y for x, y in zip(counts[column], column_counts)]
+            counts[column] = column_counts
+        snapshot.set_counts(counts)
+        if rebuild:
+            summaries = {x: querysets.describe(queryset, x) for x in columns}
+        else:
+            stored = snapshot.get_summaries()
+            summaries = {x: _merge_summary(stored.get(x), new_rows, x) for x in columns}
+        snapshot.set_summaries(summaries)
+        snapshot.last_pk = last_pk
+        snapshot.save()
+    return True
@@ -0,0 +1,158 @@
+"""
+Order statistics for chart columns.
+
+Quantiles are taken on the sorted order of the data without sorting it: the
+requested ranks are found together with a multi-rank quickselect (or
+``numpy.partition`` when NumPy is installed), which is O(n) on average.
+"""
+import math
+import random
+
+from charts.backends import NUMPY, PYTHON, numpy, resolve_backend
+
+# backend used when none is given, None for NumPy when it is installed
+default_backend = None
+
+# below this size sorting the partition is faster than splitting it again
+_SORT_THRESHOLD = 32
+
+
+class Summary(object):
+    """
+    Five numbers summary of a column (min, Q1, median, Q3, max)
+    """
+
+    def __init__(self, count, min, q1, median, q3, max):
+        self.count = count
+        self.min = min
+        self.q1 = q1
+        self.median = median
+        self.q3 = q3
+        self.max = max
+
+    @property
+    def interquartile_range(self):
+        return self.q3 - self.q1
+
+    def __repr__(self):
+        return 'Summary(count=%r, min=%r, q1=%r, median=%r, q3=%r, max=%r)' % (
+            self.count, self.min, self.q1, self.median, self.q3, self.max)
+
+
+def quantile_rank(size, r):
+    """
+    Get the rank (index in sorted order) of the r proportion quantile
+    :param size: number of data
+    :param r: proportion (ie. 0.25 for Q1 and 0.5 for median)
+    :return:
+    """
+    return min(math.floor(size * r), size - 1)
+
+
+def _python_select(values, ranks):
+    selected = dict()
+    pending = [(values, sorted(set(ranks)), 0)]
+    while pending:
+        values, ranks, offset = pending.pop()
+        if len(values) <= _SORT_THRESHOLD:
+            values = sorted(values)
+            for rank in ranks:
+                selected[rank] = values[rank - offset]
+            continue
+
+        pivot = sorted(random.sample(values, 3))[1]
+        lower = [x for x in values if x < pivot]
+        upper = [x for x in values if x > pivot]
+        upper_offset = offset + len(values) - len(upper)
+        lower_ranks, upper_ranks = list(), list()
+        for rank in ranks:
+            if rank < offset + len(lower):
+                lower_ranks.append(rank)
+            elif rank < upper_offset:
+                selected[rank] = pivot
+            else:
+                upper_ranks.append(rank)
+        if lower_ranks:
+            pending.append((lower, lower_ranks, offset))
+        if upper_ranks:
+            pending.append((upper, upper_ranks, upper_offset))
+    return selected
+
+
+def _numpy_select(values, ranks):
+    partitioned = numpy.partition(numpy.asarray(values), sorted(set(ranks)))
+    return {rank: partitioned[rank].item() for rank in ranks}
+
+
+def _resolve_backend(backend):
+    return resolve_backend(backend, default_backend)
+
+
+def select(data, ranks, backend=None):
+    """
+    Get the values at given ranks of the sorted data without sorting it
+    :param data: sequence of numbers
+    :param ranks: indexes in sorted order
+    :param backend: None for automatic selection, PYTHON or NUMPY
+    :return: dictionary of rank to value
+    """
+    if _resolve_backend(backend) == NUMPY:
+        return _numpy_select(data, ranks)
+    return _python_select(list(data), ranks)
+
+
+def quantile(data, r, backend=None):
+    """
+    Get Quantile for r proportion (ie. 0.25 for Q1 and 0.5 for median)
+    :param data:
+    :param r:
+    :param backend:
+    :return:
+    """
+    if data is not None and len(data):
+        rank = quantile_rank(len(data), r)
+        return select(data, [rank], backend)[rank]
+
+
+def describe(data, backend=None):
+    """
+    Compute min, quartiles and max of data together
+    :param data: sequence of numbers
+    :param backend: None for automatic selection, PYTHON or NUMPY
+    :return: Summary or None for empty data
+    """
+    if data is None or not len(data):
+        return None
+    size = len(data)
+    ranks = [quantile_rank(size, r) for r in (0.25, 0.5, 0.75)]
+    if _resolve_backend(backend) == NUMPY:
+        values = numpy.asarray(data)
+        selected = _numpy_select(values, ranks)
+        min_value, max_value = values.min().item(), values.max().item()
+    else:
+        selected = _python_select(list(data), ranks)
+        min_value, max_value = min(data), max(data)
+    return Summary(size, min_value, selected[ranks[0]], selected[ranks[1]], selected[ranks[2]], max_value)
+
+
+def bounds(data, backend=None):
+    """
+    Get min and max of data, ignoring NaN
+    :param data: sequence of numbers
+    :param backend: None for automatic selection, PYTHON or NUMPY
+    :return: (min, max) or None for empty data
+    """
+    if data is None or not len(data):
+        return None
+    if _resolve_backend(backend) == NUMPY:
+        values = numpy.asarray(data)
+        if values.dtype.kind not in 'iub':
+            # integers keep their type, as with describe()
+            values = values.astype(float, copy=False)
+            if numpy.isnan(values).all():
+                return None
+        return numpy.nanmin(values).item(), numpy.nanmax(values).item()
+    values = [x for x in data if x == x]
+    if not values:
+        return None
+    return min(values), max(values)
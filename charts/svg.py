@@ -0,0 +1,114 @@
+"""
+Small SVG writer.
+
+Fragments are collected in a list and joined once. Numbers are written with
+a fixed precision without trailing zeros and only text content and string
+attributes are escaped, the joined markup is marked safe as it is.
+"""
+from html import escape
+
+from django.utils.safestring import mark_safe
+
+SVG_NAMESPACE = 'http://www.w3.org/2000/svg'
+
+
+class SvgWriter(object):
+    """
+    Collect SVG fragments, ie::
+
+        writer = SvgWriter(precision=1)
+        writer.start('svg', width=500, height=450)
+        writer.element('rect', width=40.25, height=10, fill_opacity=0.5)
+        writer.end('svg')
+        writer.markup()  # '<svg width="500" height="450"><rect width="40.2" height="10" fill-opacity="0.5"/></svg>'
+
+    Underscores of attribute names are written as hyphens.
+    """
+
+    def __init__(self, precision=2):
+        """
+        :param precision: number of decimals of float values
+        """
+        self.precision = precision
+        self._parts = list()
+
+    def format_number(self, value):
+        """
+        Format a number with the writer precision and without trailing zeros
+        :param value:
+        :return:
+        """
+        if isinstance(value, int):
+            return str(value)
+        text = '%.*f' % (self.precision, value)
+        if '.' in text:
+            text = text.rstrip('0').rstrip('.')
+        return '0' if text == '-0' else text
+
+    def _format_attributes(self, attributes):
+        formatted = list()
+        for name, value in attributes.items():
+            if value is None:
+                continue
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                value = self.format_number(value)
+            else:
+                value = escape(value)
+            formatted.append(' %s="%s"' % (name.replace('_', '-'), value))
+        return ''.join(formatted)
+
+    def start(self, name, **attributes):
+        """
+        Open an element
+        :param name: tag name
+        :param attributes:
+        :return: self
+        """
+        self._parts.append('<%s%s>' % (name, self._format_attributes(attributes)))
+        return self
+
+    def end(self, name):
+        """
+        Close an element
+        :param name: tag name
+        :return: self
+        """
+        self._parts.append('</%s>' % name)
+        return self
+
+    def element(self, name, text=None, **attributes):
+        """
+        Write a complete element, self closed when it has no text
+        :param name: tag name
+        :param text: text content, escaped
+        :param attributes:
+        :return: self
+        """
+        if text is None:
+            self._parts.append('<%s%s/>' % (name, self._format_attributes(attributes)))
+        else:
+            self._parts.append('<%s%s>%s</%s>' % (name, self._format_attributes(attributes), escape(text), name))
+        return self
+
+    def flush(self):
+        """
+        Join fragments collected since the last flush and forget them, for streaming
+        :return:
+        """
+        value = ''.join(self._parts)
+        self._parts = list()
+        return value
+
+    def getvalue(self):
+        """
+        Join collected fragments
+        :return:
+        """
+        return ''.join(self._parts)
+
+    def markup(self):
+        """
+        Join collected fragments as safe markup
+        :return:
+        """
+        return mark_safe(self.getvalue())
@@ -0,0 +1,72 @@
+from django import template
+from django.template.base import token_kwargs
+from django.urls import reverse
+from django.utils.html import format_html
+
+from charts import fragments
+from charts.cache import DEFAULT_TIMEOUT
+
+register = template.Library()
+
+
+class ChartNode(template.Node):
+    """
+    Render a chart when the node is output, through the fragment cache
+    """
+
+    def __init__(self, chart, lazy=False, timeout=None, alt=None):
+        self.chart = chart
+        self.lazy = lazy
+        self.timeout = timeout
+        self.alt = alt
+
+    def _resolve_timeout(self, context):
+        if self.timeout is None:
+            return DEFAULT_TIMEOUT
+        timeout = self.timeout.resolve(context)
+        if timeout is None:
+            return None
+        try:
+            return int(timeout)
+        except (ValueError, TypeError):
+            raise template.TemplateSyntaxError('"chart" tag got a non-integer timeout value: %r' % (timeout,))
+
+    def render(self, context):
+        chart = self.chart.resolve(context)
+        if not chart:
+            return ''
+        timeout = self._resolve_timeout(context)
+        if not self.lazy:
+            return fragments.render_fragment(chart, timeout)
+        fingerprint = fragments.store_chart(chart, timeout)
+        width, height = chart.svg_size()
+        alt = self.alt.resolve(context) if self.alt is not None else ''
+        # images of live charts are served with a short max age, not as immutable
+        url_name = 'simple_charts_live_svg' if chart.has_live_data() else 'simple_charts_svg'
+        return format_html('<img src="{}" width="{}" height="{}" alt="{}" loading="lazy">',
+                           reverse(url_name, kwargs={'fingerprint': fingerprint}), width, height, alt)
+
+
+@register.tag
+def chart(parser, token):
+    """
+    Render a chart, ie. {% chart histogram %}, markup is cached under the chart fingerprint.
+    With "lazy" an <img> fetching the SVG from the chart endpoint is rendered instead::
+
+        {% chart histogram lazy alt="Response times" timeout=600 %}
+    """
+    bits = token.split_contents()
+    if len(bits) < 2:
+        raise template.TemplateSyntaxError('"chart" tag takes at least one argument: the chart')
+    chart_expression = parser.compile_filter(bits[1])
+    remaining = bits[2:]
+    lazy = bool(remaining) and remaining[0] == 'lazy'
+    if lazy:
+        remaining = remaining[1:]
+    options = token_kwargs(remaining, parser)
+    if remaining:
+        raise template.TemplateSyntaxError('"chart" tag got unexpected arguments: %s' % ' '.join(remaining))
+    unknown = set(options) - {'timeout', 'alt'}
+    if unknown:
+        raise template.TemplateSyntaxError('"chart" tag got unknown options: %s' % ', '.join(sorted(unknown)))
+    return ChartNode(chart_expression, lazy, options.get('timeout'), options.get('alt'))
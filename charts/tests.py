@@ -1,3 +1,717 @@
-from django.test import TestCase
+import asyncio
+import os
+import pickle
+import random
+import tempfile
+import threading
+from array import array
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import iscoroutinefunction
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import DecimalField
+from django.db.models.functions import Cast
+from django.template import Context, Template, TemplateSyntaxError
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, modify_settings
+from django.test.utils import CaptureQueriesContext
+
+from charts import (benchmarks, binning, downsampling, executors, fragments, instrumentation, lazy, parallel,
+                    querysets, stats)
+from charts.Charts import Histogram, LineChart, ScatterChart
+from charts.cache import LocalLRUCache, RenderCache
+from charts.columns import load_column, normalize_column
+from charts.middleware import ChartProfilingMiddleware
+from charts.models import ChartSnapshot
+from charts.signals import chart_rendered
+from charts.sketches import KLLSketch, merge_sketches
+from charts.svg import SvgWriter
+from charts.views import get_sample_histogram
+
+
+def _legacy_count(data, min_bin, max_bin):
+    return len([x for x in data if min_bin <= x < max_bin])
+
+
+class BinningTestCase(SimpleTestCase):
+    def setUp(self):
+        generator = random.Random(1)
+        self.data = [generator.uniform(-50, 50) for _ in range(2000)] + list(range(-50, 50)) + [float('nan')]
+        self.backends = [binning.PYTHON] + ([binning.NUMPY] if binning.numpy is not None else [])
+
+    def test_uniform_counts_match_range_semantics(self):
+        for min_value, width, breaks in ((-50, 10, 10), (-50.0, 0.1, 1000), (-37.3, 3.7, 20)):
+            expected = [_legacy_count(self.data, low, high)
+                        for low, high in binning.uniform_bin_ranges(min_value, width, breaks)]
+            for backend in self.backends:
+                self.assertEqual(binning.count_uniform(self.data, min_value, width, breaks, backend), expected)
+
+    def test_edges_counts_match_range_semantics(self):
+        edges = [-50, -10, -1, 0, 0.5, 7, 49.9]
+        expected = [_legacy_count(self.data, low, high) for low, high in binning.edges_bin_ranges(edges)]
+        for backend in self.backends:
+            self.assertEqual(binning.count_edges(self.data, edges, backend), expected)
+
+    def test_matrix_matches_columns(self):
+        columns = [self.data, None, self.data[:100]]
+        expected = [binning.count_uniform(x or [], -50, 7, 15, binning.PYTHON) for x in columns]
+        for backend in self.backends:
+            self.assertEqual(binning.count_uniform_matrix(columns, -50, 7, 15, backend), expected)
+
+    def test_edges_must_increase(self):
+        with self.assertRaises(ValueError):
+            binning.count_edges(self.data, [0, 2, 1])
+
+
+class ParallelBinningTestCase(SimpleTestCase):
+    def setUp(self):
+        generator = random.Random(6)
+        self.columns = [array('d', (generator.gauss(0, 10) for _ in range(3000))), None, [1.5, 2, 100]]
+        self.backends = [binning.PYTHON] + ([binning.NUMPY] if binning.numpy is not None else [])
+        min_shard_size, parallel.min_shard_size = parallel.min_shard_size, 500
+        self.addCleanup(setattr, parallel, 'min_shard_size', min_shard_size)
+
+    def test_counts_match_serial_binning(self):
+        edges = [-30, -5, 0, 0.5, 12, 40]
+        for backend in self.backends:
+            self.assertEqual(parallel.count_matrix(self.columns, -40, 3.5, 20, backend=backend, workers=3),
+                             binning.count_uniform_matrix(self.columns, -40, 3.5, 20, backend))
+            self.assertEqual(parallel.count_matrix(self.columns, edges=edges, backend=backend, workers=3),
+                             binning.count_edges_matrix(self.columns, edges, backend))
+
+    def test_histogram_parallel_mode(self):
+        data_dictionary = {'a': {'data': self.columns[0]}, 'b': {'data': self.columns[2]}}
+        histogram = Histogram(data_dictionary).set_columns(['a', 'b']).set_breaks(15)
+        self.assertEqual(histogram.set_parallel(True).compute().counts, histogram.set_parallel(False).compute().counts)
+
+
+class StatsTestCase(SimpleTestCase):
+    def test_describe_uses_sorted_order(self):
+        generator = random.Random(2)
+        data = [generator.randint(0, 300) for _ in range(1001)]
+        ordered = sorted(data)
+        backends = [stats.PYTHON] + ([stats.NUMPY] if stats.numpy is not None else [])
+        for backend in backends:
+            summary = stats.describe(data, backend)
+            self.assertEqual((summary.min, summary.q1, summary.median, summary.q3, summary.max),
+                             (ordered[0], ordered[250], ordered[500], ordered[750], ordered[-1]))
+
+    def test_describe_empty_data(self):
+        self.assertIsNone(stats.describe([]))
+
+
+class SparseAndLogBinningTestCase(SimpleTestCase):
+    def setUp(self):
+        generator = random.Random(8)
+        self.data = [generator.lognormvariate(0, 2) for _ in range(20000)]
+        self.backends = [binning.PYTHON] + ([binning.NUMPY] if binning.numpy is not None else [])
+
+    def _histogram(self):
+        return Histogram({'a': {'data': self.data}, 'b': {'data': self.data[::3]}}).set_columns(['a', 'b'])
+
+    def test_sparse_counts_match_dense_counts(self):
+        dense = binning.count_uniform_matrix([self.data, None], 0.01, 0.37, 5000)
+        for backend in self.backends:
+            sparse = binning.count_uniform_sparse([self.data, None], 0.01, 0.37, 5000, backend)
+            self.assertEqual(sparse, [{index: x for index, x in enumerate(row) if x} for row in dense])
+
+    def test_sparse_histogram_skips_empty_bins(self):
+        dense = self._histogram().set_max_breaks(None).compute()
+        result = self._histogram().set_max_breaks(None).set_sparse().compute()
+        self.assertEqual(result.breaks, dense.breaks)
+        expected = [(low, high, counts) for low, high, counts in dense.iter_bins() if any(counts)]
+        self.assertEqual(list(result.iter_bins()), expected)
+        histogram = self._histogram().set_sparse()
+        self.assertEqual(histogram.html_svg().count('<g>'), len(histogram.compute().bin_ranges))
+
+    def test_breaks_are_capped(self):
+        self.assertGreater(self._histogram().set_max_breaks(None).compute().breaks, 1000)
+        result = self._histogram().compute()
+        self.assertLessEqual(result.breaks, 1000)
+        self.assertEqual(sum(result.counts['a']), sum(self._histogram().set_max_breaks(None).compute().counts['a']))
+        self.assertEqual(self._histogram().set_breaks(2000).compute().breaks, 2000)
+        self.assertEqual(self._histogram().set_scale(Histogram.LOG).set_breaks(2000).compute().breaks, 2000)
+
+    def test_log_scale(self):
+        result = self._histogram().set_scale(Histogram.LOG).set_breaks(12).compute()
+        self.assertEqual(result.breaks, 12)
+        self.assertEqual(result.bin_ranges[0][0], min(self.data))
+        ratios = [high / low for low, high in result.bin_ranges]
+        self.assertAlmostEqual(min(ratios), max(ratios))
+        self.assertAlmostEqual(result.x_position(result.bin_ranges[-1][1]), result.svg_width + 50)
+        with self.assertRaises(ValueError):
+            Histogram({'a': {'data': [0, 1, 2]}}).set_columns(['a']).set_scale(Histogram.LOG).compute()
+
+    def test_log_scale_counts_every_value(self):
+        for seed in range(50):
+            generator = random.Random(seed)
+            data = [generator.lognormvariate(0, 2) for _ in range(200)]
+            for breaks in (None, 7):
+                histogram = Histogram({'a': {'data': data}}).set_columns(['a']).set_scale(Histogram.LOG)
+                self.assertEqual(sum(histogram.set_breaks(breaks).compute().counts['a']), len(data))
+
+
+class SketchesTestCase(SimpleTestCase):
+    def setUp(self):
+        generator = random.Random(7)
+        self.data = [generator.lognormvariate(0, 1.5) for _ in range(100000)]
+        self.sorted_data = sorted(self.data)
+
+    def _assert_rank_error(self, sketch, max_error=0.01):
+        self.assertEqual((sketch.count, sketch.min, sketch.max), (len(self.data), min(self.data), max(self.data)))
+        for r in (0.01, 0.25, 0.5, 0.75, 0.99):
+            rank = self.sorted_data.index(sketch.quantile(r))
+            self.assertLess(abs(rank - r * len(self.data)), max_error * len(self.data))
+
+    def test_rank_error_is_bounded(self):
+        sketch = KLLSketch().update(self.data)
+        self.assertLess(sketch.size, 1000)
+        self._assert_rank_error(sketch)
+
+    def test_merged_partitions(self):
+        partitions = [KLLSketch(seed=x).update(self.data[x::3]) for x in range(3)]
+        serialized = [x.to_bytes() for x in partitions]
+        self._assert_rank_error(merge_sketches([KLLSketch.from_bytes(x) for x in serialized]))
+
+    def test_histogram_from_sketches(self):
+        partitions = [KLLSketch(seed=x).update(self.data[x::2]) for x in range(2)]
+        result = Histogram.from_sketches({'a': partitions}).set_breaks(20).compute()
+        expected = Histogram({'a': {'data': self.data}}).set_columns(['a']).set_breaks(20).compute()
+        self.assertEqual(result.bin_ranges, expected.bin_ranges)
+        self.assertEqual(sum(result.counts['a']), len(self.data))
+        for count, expected_count in zip(result.counts['a'], expected.counts['a']):
+            self.assertLess(abs(count - expected_count), 0.01 * len(self.data))
+
+    def test_mixed_sketch_and_data_columns(self):
+        histogram = Histogram({'b': {'data': self.data}}).set_columns(['a', 'b'])
+        histogram.add_sketch('a', KLLSketch().update(range(100)))
+        summary = histogram._get_aggregated_summary()
+        self.assertEqual((summary.count, summary.min, summary.max), (len(self.data) + 100, 0, max(self.data)))
+        expected = stats.describe(list(range(100)) + self.data)
+        self.assertLess(abs(summary.interquartile_range - expected.interquartile_range),
+                        0.05 * expected.interquartile_range)
+
+    def test_approximate_mode(self):
+        histogram = Histogram({'a': {'data': self.data}}).set_columns(['a']).set_approximate()
+        expected = Histogram({'a': {'data': self.data}}).set_columns(['a']).compute()
+        result = histogram.compute()
+        self.assertEqual((result.min_x_value, result.max_x_value), (expected.min_x_value, expected.max_x_value))
+        self.assertLess(abs(result.bins_width - expected.bins_width), 0.05 * expected.bins_width)
+        self.assertEqual(sum(result.counts['a']), sum(expected.counts['a']))
+
+
+class HistogramResultTestCase(SimpleTestCase):
+    def setUp(self):
+        self.data_dictionary = {'a': {'data': [1, 2, 2, 3, 5, 8, 9]}, 'b': {'data': [4, 4, 4]}}
+
+    def test_compute_does_not_change_chart(self):
+        histogram = Histogram(self.data_dictionary).set_columns(['a']).set_breaks(4)
+        result = histogram.compute()
+        self.assertEqual(result.counts['a'], (3, 1, 1, 1))
+        self.assertIsNone(histogram.min_x_value)
+        self.assertIsNone(histogram.bins_width)
+
+    def test_multi_column_layouts(self):
+        histogram = Histogram(self.data_dictionary).set_columns(['a', 'b']).set_breaks(4)
+        result = histogram.compute()
+        self.assertEqual(result.matrix, ((3, 1, 1, 1), (0, 3, 0, 0)))
+        self.assertEqual(result.max_count, 3)
+        self.assertEqual(histogram.set_layout(Histogram.STACKED).compute().max_count, 4)
+        self.assertEqual(histogram.html_svg().count('<rect'), 8)
+
+    def test_edges_wider_than_data(self):
+        histogram = Histogram({'a': {'data': [5, 6, 7]}}).set_columns(['a']).set_edges([0, 10, 20])
+        result = histogram.compute()
+        self.assertEqual((result.min_x_value, result.max_x_value), (0, 20))
+        markup = histogram.html_svg()
+        self.assertIn('<rect width="200" height="400" x="50" y="0"/>', markup)
+        self.assertIn('<rect width="200" height="0" x="250" y="400"/>', markup)
+        self.assertEqual(histogram.set_min_x_value(5).compute().min_x_value, 5)
+
+    def test_summaries_follow_data_and_settings(self):
+        data = [1, 2, 3, 4]
+        histogram = Histogram({'a': {'data': data}}).set_columns(['a']).set_breaks(2)
+        self.assertEqual(histogram.compute().max_x_value, 4)
+        data.append(100)
+        result = histogram.compute()
+        self.assertEqual((result.max_x_value, sum(result.counts['a'])), (100, 5))
+        exact = histogram._get_column_summary('a')
+        self.assertIs(histogram._get_column_summary('a'), exact)
+        self.assertIsNot(histogram.set_approximate()._get_column_summary('a'), exact)
+
+    def test_result_is_immutable(self):
+        result = Histogram(self.data_dictionary).set_columns(['a']).set_breaks(4).compute()
+        with self.assertRaises(AttributeError):
+            result.max_y = 10
+
+    def test_histograms_do_not_share_state(self):
+        first = Histogram(self.data_dictionary).set_columns(['a']).set_breaks(4)
+        second = Histogram(self.data_dictionary).set_columns(['b']).set_breaks(4)
+        self.assertEqual(first.compute().columns, ('a',))
+        self.assertEqual(second.compute().columns, ('b',))
+        self.assertEqual(Histogram(self.data_dictionary).columns, [])
+
+
+class RenderCacheTestCase(SimpleTestCase):
+    def setUp(self):
+        self.data_dictionary = {'a': {'data': [1, 2, 2, 3, 5, 8, 9]}}
+        self.render_cache = RenderCache()
+
+    def test_repeated_render_hits_cache(self):
+        histogram = Histogram(self.data_dictionary).set_columns(['a']).set_breaks(4)
+        histogram.set_render_cache(self.render_cache)
+        markup = histogram.html_svg()
+        self.assertEqual(histogram.html_svg(), markup)
+        self.assertEqual((self.render_cache.hits, self.render_cache.misses), (1, 1))
+        self.render_cache.invalidate(histogram)
+        histogram.html_svg()
+        self.assertEqual(self.render_cache.misses, 2)
+
+    def test_settings_change_fingerprint(self):
+        histogram = Histogram(self.data_dictionary).set_columns(['a']).set_breaks(4)
+        fingerprint = histogram.fingerprint()
+        self.assertEqual(Histogram(self.data_dictionary).set_columns(['a']).set_breaks(4).fingerprint(), fingerprint)
+        self.assertNotEqual(histogram.set_breaks(5).fingerprint(), fingerprint)
+
+    def test_miss_fingerprints_once(self):
+        histogram = Histogram(self.data_dictionary).set_columns(['a']).set_breaks(4)
+        with mock.patch.object(Histogram, 'fingerprint', autospec=True, side_effect=Histogram.fingerprint) as patched:
+            histogram.set_render_cache(self.render_cache).html_svg()
+        self.assertEqual(patched.call_count, 1)
+
+    def test_data_version_replaces_data_hash(self):
+        histogram = Histogram(self.data_dictionary).set_columns(['a']).set_breaks(4).set_data_version(1)
+        fingerprint = histogram.fingerprint()
+        with mock.patch.object(Histogram, '_iter_data_fingerprint') as patched:
+            self.assertEqual(histogram.fingerprint(), fingerprint)
+        patched.assert_not_called()
+        self.assertNotEqual(histogram.set_data_version(2).fingerprint(), fingerprint)
+
+    def test_local_cache_eviction(self):
+        cache = LocalLRUCache(max_entries=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertEqual((cache.get('a'), cache.get('b'), cache.get('c')), (1, None, 3))
+        cache.set('d', 4, timeout=0)
+        self.assertIsNone(cache.get('d'))
+
+
+class StreamingHistogramTestCase(SimpleTestCase):
+    def test_chunks_give_same_counts_as_materialized_data(self):
+        generator = random.Random(3)
+        data = [generator.gauss(0, 10) for _ in range(1000)]
+        expected = Histogram({'a': {'data': data}}).set_columns(['a']).set_min_x_value(-30).set_max_x_value(30)
+        expected.set_breaks(12)
+        streamed = Histogram().set_columns(['a']).set_min_x_value(-30).set_max_x_value(30).set_breaks(12)
+        streamed.stream_chunk_size = 64
+        streamed.add_values('a', iter(data))
+        self.assertEqual(streamed.compute().counts, expected.compute().counts)
+        counter = streamed.bin_counters['a']
+        self.assertEqual((counter.total, counter.min, counter.max), (1000, min(data), max(data)))
+
+    def test_streaming_needs_fixed_bins(self):
+        with self.assertRaises(ValueError):
+            Histogram().set_columns(['a']).add_values('a', [1, 2, 3])
+
+    def test_streamed_log_scale_bins(self):
+        streamed = Histogram().set_columns(['a']).set_min_x_value(1).set_max_x_value(1000).set_breaks(3)
+        streamed.set_scale(Histogram.LOG).add_values('a', [2, 50, 500, 999])
+        self.assertEqual(streamed.compute().counts['a'], (1, 1, 2))
+
+    def test_streamed_bins_must_match_chart_bins(self):
+        streamed = Histogram().set_columns(['a']).set_min_x_value(0).set_max_x_value(30).set_breaks(3)
+        streamed.add_values('a', [1, 12, 25])
+        with self.assertRaises(ValueError):
+            streamed.set_max_x_value(60).compute()
+
+
+class QuerySetHistogramTestCase(TestCase):
+    def setUp(self):
+        self.ids = random.Random(4).sample(range(1, 5000), 400)
+        User.objects.bulk_create([User(id=x, username='user%d' % x) for x in self.ids])
+        self.queryset = User.objects.all()
+
+    def test_counts_match_python_path(self):
+        for breaks in (None, 7, 30):
+            expected = Histogram({'id': {'data': self.ids}}).set_columns(['id']).set_breaks(breaks).compute()
+            result = Histogram().set_queryset(self.queryset).set_columns(['id']).set_breaks(breaks).compute()
+            self.assertEqual(result.bin_ranges, expected.bin_ranges)
+            self.assertEqual(result.counts, expected.counts)
+
+    def test_edges_counts_match_python_path(self):
+        edges = [0, 10.5, 100, 1000, 2500, 4999]
+        expected = Histogram({'id': {'data': self.ids}}).set_columns(['id']).set_edges(edges).compute()
+        result = Histogram().set_queryset(self.queryset).set_columns(['id']).set_edges(edges).compute()
+        self.assertEqual(result.counts, expected.counts)
+
+    def test_added_rows_change_chart(self):
+        histogram = Histogram().set_queryset(self.queryset).set_columns(['id']).set_breaks(4)
+        fingerprint, result = histogram.fingerprint(), histogram.compute()
+        User.objects.create(id=9000, username='user9000')
+        self.assertNotEqual(histogram.fingerprint(), fingerprint)
+        self.assertEqual(histogram.compute().max_x_value, 9000)
+        self.assertGreater(sum(histogram.compute().counts['id']), sum(result.counts['id']))
+
+    def test_lazy_live_chart_is_not_immutable(self):
+        fragments.get_fragment_cache().clear()
+        histogram = Histogram().set_queryset(self.queryset).set_columns(['id']).set_breaks(4)
+        markup = Template('{% load simple_charts %}{% chart histogram lazy %}').render(Context({'histogram': histogram}))
+        url = '/charts/svg/live/%s.svg' % histogram.fingerprint()
+        self.assertIn('src="%s"' % url, markup)
+        response = self.client.get(url)
+        self.assertEqual(response.content.decode(), histogram.html_svg())
+        self.assertNotIn('immutable', response['Cache-Control'])
+        self.assertIn('max-age=300', response['Cache-Control'])
+
+    def test_stored_chart_is_not_evaluated(self):
+        fragments.get_fragment_cache().clear()
+        histogram = Histogram().set_queryset(self.queryset).set_columns(['id']).set_breaks(4)
+        with CaptureQueriesContext(connection) as queries:
+            fingerprint = fragments.store_chart(histogram)
+        # only the version of the rows for the fingerprint, rows are not fetched
+        self.assertEqual(len(queries.captured_queries), 1)
+        self.assertIsNone(self.queryset._result_cache)
+        self.assertEqual(fragments.render_stored_chart(fingerprint), histogram.html_svg())
+
+    def test_describe_in_database(self):
+        summary = querysets.describe(self.queryset, 'id')
+        expected = stats.describe(self.ids)
+        self.assertEqual((summary.count, summary.min, summary.q1, summary.median, summary.q3, summary.max),
+                         (expected.count, expected.min, expected.q1, expected.median, expected.q3, expected.max))
+
+    def test_fixed_breaks_read_only_bounds(self):
+        histogram = Histogram().set_queryset(self.queryset).set_columns(['id']).set_breaks(10)
+        with CaptureQueriesContext(connection) as queries:
+            result = histogram.compute()
+        self.assertEqual((result.min_x_value, result.max_x_value), (min(self.ids), max(self.ids)))
+        self.assertFalse([x for x in queries.captured_queries if 'OFFSET' in x['sql']])
+
+    def test_decimal_field(self):
+        queryset = self.queryset.annotate(score=Cast('id', DecimalField(max_digits=10, decimal_places=2)))
+        summary = querysets.describe(queryset, 'score')
+        self.assertIsInstance(summary.median, float)
+        result = Histogram().set_queryset(queryset).set_columns(['score']).compute()
+        expected = Histogram().set_queryset(self.queryset).set_columns(['id']).compute()
+        self.assertEqual(result.counts['score'], expected.counts['id'])
+
+    def test_queryset_and_data_columns_are_aggregated(self):
+        histogram = Histogram({'other': {'data': [1000, 1000.5, 1001]}}).set_queryset(self.queryset) \
+            .set_columns(['id', 'other'])
+        self.assertEqual(histogram._get_aggregated_summary().count, len(self.ids) + 3)
+        result = histogram.compute()
+        self.assertEqual(sum(result.counts['id']), len(self.ids))
+        self.assertEqual(sum(result.counts['other']), 3)
+
+
+class ChartSnapshotTestCase(TestCase):
+    def setUp(self):
+        self.ids = sorted(random.Random(5).sample(range(1, 5000), 400))
+        User.objects.bulk_create([User(id=x, username='user%d' % x) for x in self.ids[:300]])
+
+    def _add_remaining_users(self):
+        User.objects.bulk_create([User(id=x, username='user%d' % x) for x in self.ids[300:]])
+
+    def _assert_matches_queryset(self, snapshot):
+        snapshot.refresh_from_db()
+        result = Histogram.from_snapshot(snapshot).compute()
+        expected = Histogram().set_queryset(User.objects.all()).set_columns(['id']) \
+            .set_edges(snapshot.get_edges()).compute()
+        self.assertEqual(result.bin_ranges, expected.bin_ranges)
+        self.assertEqual(result.counts, expected.counts)
+        self.assertEqual(snapshot.last_pk, max(User.objects.values_list('id', flat=True)))
+
+    def test_incremental_refresh(self):
+        snapshot = ChartSnapshot(name='users', model='auth.User', fixed_edges=True)
+        snapshot.set_columns(['id'])
+        snapshot.set_edges([0, 1000, 2500, 5000])
+        snapshot.save()
+        call_command('charts_refresh_snapshots', stdout=open(os.devnull, 'w'))
+        self._assert_matches_queryset(snapshot)
+        self._add_remaining_users()
+        with CaptureQueriesContext(connection) as queries:
+            call_command('charts_refresh_snapshots', 'users', stdout=open(os.devnull, 'w'))
+        # quartiles of the whole table are not read again
+        self.assertFalse([x['sql'] for x in queries if 'OFFSET' in x['sql']])
+        self._assert_matches_queryset(snapshot)
+        summary = snapshot.get_summaries()['id']
+        self.assertEqual((summary.count, summary.min, summary.max), (400, self.ids[0], self.ids[-1]))
+
+    def test_widened_range_rebuilds_edges(self):
+        snapshot = ChartSnapshot(name='users', model='auth.User', breaks=8)
+        snapshot.set_columns(['id'])
+        snapshot.save()
+        call_command('charts_refresh_snapshots', stdout=open(os.devnull, 'w'))
+        self._add_remaining_users()
+        call_command('charts_refresh_snapshots', stdout=open(os.devnull, 'w'))
+        self._assert_matches_queryset(snapshot)
+        edges = snapshot.get_edges()
+        self.assertEqual((len(edges), edges[0], edges[1] - edges[0]),
+                         (9, self.ids[0], -(-(self.ids[-1] - self.ids[0]) // 8)))
+        self.assertEqual(snapshot.get_summaries()['id'].count, 400)
+
+
+class SvgWriterTestCase(SimpleTestCase):
+    def test_compact_numbers_and_escaped_text(self):
+        writer = SvgWriter(precision=2)
+        writer.start('svg', width=500, height=12.5, aria_labelledby='title desc')
+        writer.element('rect', x=1 / 3, y=-0.001, height=2.0)
+        writer.element('text', '{a} < b', x=0)
+        writer.end('svg')
+        self.assertEqual(writer.markup(), '<svg width="500" height="12.5" aria-labelledby="title desc">'
+                                          '<rect x="0.33" y="0" height="2"/><text x="0">{a} &lt; b</text></svg>')
+
+
+class ChartViewsTestCase(SimpleTestCase):
+    def test_sample_page(self):
+        response = self.client.get('/charts/sample-charts/')
+        self.assertContains(response, '<svg')
+
+    def test_streamed_svg(self):
+        response = self.client.get('/charts/sample-charts/histogram.svg')
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'image/svg+xml')
+        content = b''.join(response.streaming_content).decode()
+        self.assertEqual(content, get_sample_histogram().html_svg())
+
+
+class CountedHistogram(Histogram):
+    renders = 0
+
+    def html_svg(self, result=None):
+        CountedHistogram.renders += 1
+        return super().html_svg(result)
+
+
+class ChartTemplateTagTestCase(SimpleTestCase):
+    def setUp(self):
+        fragments.get_fragment_cache().clear()
+        CountedHistogram.renders = 0
+        self.chart = CountedHistogram({'col1': {'data': list(range(100))}}).set_columns(['col1'])
+
+    def render(self, source, **context):
+        return Template('{% load simple_charts %}' + source).render(Context(context))
+
+    def test_rendered_once_when_output(self):
+        source = '{% if show %}{% chart histogram %}{% endif %}'
+        self.assertEqual(self.render(source, histogram=self.chart, show=False), '')
+        self.assertEqual(CountedHistogram.renders, 0)
+        expected = Histogram({'col1': {'data': list(range(100))}}).set_columns(['col1']).html_svg()
+        for _ in range(2):
+            self.assertEqual(self.render(source, histogram=self.chart, show=True), expected)
+        self.assertEqual(CountedHistogram.renders, 1)
+        self.assertIsNotNone(fragments.get_fragment_cache().get(fragments.get_fragment_key(self.chart.fingerprint())))
+
+    def test_lazy_placeholder_and_endpoint(self):
+        markup = self.render('{% chart histogram lazy alt=title %}', histogram=self.chart, title='A & B')
+        url = '/charts/svg/%s.svg' % self.chart.fingerprint()
+        self.assertEqual(markup, '<img src="%s" width="500" height="450" alt="A &amp; B" loading="lazy">' % url)
+        self.assertEqual(CountedHistogram.renders, 0)
+        expected = Histogram({'col1': {'data': list(range(100))}}).set_columns(['col1']).html_svg()
+        for _ in range(2):
+            response = self.client.get(url)
+            self.assertEqual(response['Content-Type'], 'image/svg+xml')
+            self.assertIn('immutable', response['Cache-Control'])
+            self.assertEqual(response.content.decode(), expected)
+        self.assertEqual(CountedHistogram.renders, 1)
+        self.assertEqual(self.client.get('/charts/svg/unknown.svg').status_code, 404)
+
+    def test_invalid_options(self):
+        with self.assertRaises(TemplateSyntaxError):
+            Template('{% load simple_charts %}{% chart histogram size=2 %}')
+
+
+class AsyncRenderTestCase(SimpleTestCase):
+    def test_thread_and_process_executors(self):
+        expected = get_sample_histogram().html_svg()
+        for kind in executors.KINDS:
+            executor = executors.create_executor(kind, max_workers=2)
+            self.addCleanup(executor.shutdown)
+            render_cache = RenderCache()
+            chart = get_sample_histogram().set_render_cache(render_cache)
+            self.assertEqual(asyncio.run(chart.ahtml_svg(executor=executor)), expected)
+            self.assertEqual(asyncio.run(chart.ahtml_svg(executor=executor)), expected)
+            self.assertEqual((render_cache.hits, render_cache.misses), (1, 1))
+
+    def test_process_executor_is_not_forked(self):
+        with mock.patch('concurrent.futures.ProcessPoolExecutor') as pool:
+            executors.create_executor(executors.PROCESS, max_workers=1)
+        self.assertEqual(pool.call_args.kwargs['mp_context'].get_start_method(), parallel.start_method)
+
+    def test_process_executor_cache_off_event_loop(self):
+        executor = executors.create_executor(executors.PROCESS, max_workers=1)
+        self.addCleanup(executor.shutdown)
+        threads = list()
+
+        class RecordingCache(RenderCache):
+            def get_key(self, chart):
+                threads.append(threading.current_thread())
+                return super().get_key(chart)
+
+            def get(self, chart, key=None):
+                threads.append(threading.current_thread())
+                return super().get(chart, key)
+
+            def set(self, chart, markup, key=None):
+                threads.append(threading.current_thread())
+                super().set(chart, markup, key)
+
+        chart = get_sample_histogram().set_render_cache(RecordingCache())
+        asyncio.run(chart.ahtml_svg(executor=executor))
+        self.assertEqual(len(threads), 3)
+        self.assertNotIn(threading.main_thread(), threads)
+
+    def test_pickled_result(self):
+        result = get_sample_histogram().compute()
+        self.assertEqual(pickle.loads(pickle.dumps(result)).counts, result.counts)
+
+    def test_async_view(self):
+        response = self.client.get('/charts/sample-charts/async/')
+        self.assertContains(response, '<path')
+        self.assertContains(response, get_sample_histogram().html_svg(), html=False)
+
+
+class ProfilingTestCase(SimpleTestCase):
+    def test_disabled_by_default(self):
+        self.assertIsNone(instrumentation.start_profile(get_sample_histogram()))
+
+    def test_rendered_signal(self):
+        profiles = list()
+
+        def receiver(sender, chart, profile, **kwargs):
+            profiles.append(profile)
+
+        chart_rendered.connect(receiver)
+        self.addCleanup(chart_rendered.disconnect, receiver)
+        instrumentation.enable()
+        self.addCleanup(instrumentation.disable)
+        markup = get_sample_histogram().html_svg()
+        self.assertEqual(len(profiles), 1)
+        profile = profiles[0]
+        self.assertEqual(set(profile.phases), {instrumentation.ATTRIBUTES, instrumentation.BINNING,
+                                               instrumentation.SCALING, instrumentation.RENDERING})
+        self.assertGreaterEqual(profile.total, sum(profile.phases.values()))
+        self.assertEqual(profile.elements, markup.count('<rect') + markup.count('<text') + markup.count('<line') +
+                         markup.count('<g') + 1)
+        self.assertEqual(profile.output_bytes, len(markup.encode()))
+
+    @modify_settings(MIDDLEWARE={'append': 'charts.middleware.ChartProfilingMiddleware'})
+    def test_server_timing_header(self):
+        fragments.get_fragment_cache().clear()
+        response = self.client.get('/charts/sample-charts/')
+        self.assertEqual(len(response.wsgi_request.chart_profiles), 1)
+        self.assertTrue(response['Server-Timing'].startswith('charts;dur='))
+
+    def test_async_server_timing_header(self):
+        async def get_response(request):
+            return HttpResponse(await get_sample_histogram().ahtml_svg())
+
+        middleware = ChartProfilingMiddleware(get_response)
+        self.assertTrue(iscoroutinefunction(middleware))
+        request = RequestFactory().get('/')
+        response = asyncio.run(middleware(request))
+        self.assertEqual(len(request.chart_profiles), 1)
+        self.assertTrue(response['Server-Timing'].startswith('charts;dur='))
+
+
+class SeriesChartTestCase(SimpleTestCase):
+    def setUp(self):
+        generator = random.Random(2)
+        self.xs = [x / 10 for x in range(5000)]
+        self.ys = [float(generator.randrange(50)) for _ in self.xs]
+        self.backends = [downsampling.PYTHON] + ([downsampling.NUMPY] if downsampling.numpy is not None else [])
+
+    def test_backends_select_same_points(self):
+        for method in downsampling.METHODS:
+            selected = [downsampling.downsample(self.xs, self.ys, 300, method, x) for x in self.backends]
+            self.assertLessEqual(len(selected[0]), 300)
+            self.assertEqual(selected[0], sorted(selected[0]))
+            self.assertEqual(selected[0], selected[-1])
+
+    def test_min_max_keeps_extremes(self):
+        indexes = downsampling.min_max(self.xs, self.ys, 100)
+        self.assertEqual(min(self.ys[x] for x in indexes), min(self.ys))
+        self.assertEqual(max(self.ys[x] for x in indexes), max(self.ys))
+
+    def test_points_are_capped_at_width(self):
+        data_dictionary = {'x': {'data': self.xs}, 'y': {'data': self.ys[:-1] + [float('nan')]}}
+        for chart_class in (LineChart, ScatterChart):
+            chart = chart_class(data_dictionary).set_x_column('x').set_columns(['y']).set_min_x_value(10)
+            result = chart.compute()
+            self.assertEqual(result.sizes, (len(self.xs) - 101,))
+            self.assertLessEqual(len(result.points('y')), chart.svg_width)
+            self.assertGreaterEqual(min(x for x, _ in result.points('y')), 10)
+            markup = chart.html_svg()
+            self.assertEqual(markup.count('<path'), 1)
+
+    def test_every_point_without_downsampling(self):
+        chart = LineChart({'y': {'data': [1, 3, 2]}}).set_columns(['y']).set_downsampling(None).set_axis(False)
+        result = chart.compute()
+        self.assertEqual(result.points('y'), ((0, 1), (1, 3), (2, 2)))
+        self.assertIn('d="M50 400L250 0L450 200"', chart.html_svg())
+
+
+class ColumnsTestCase(SimpleTestCase):
+    def test_double_arrays_are_not_copied(self):
+        data = array('d', [1.5, 2, 3])
+        self.assertIs(normalize_column(data), data)
+        self.assertEqual(list(normalize_column(memoryview(data).cast('B'))), [1.5, 2, 3])
+        self.assertEqual(list(normalize_column(array('i', [1, 2]))), [1, 2])
+
+    def test_replaced_data_is_normalized_again(self):
+        data_dictionary = {'a': {'data': array('i', [1, 2])}}
+        histogram = Histogram(data_dictionary).set_columns(['a']).set_breaks(2)
+        fingerprint = histogram.fingerprint()
+        self.assertEqual(histogram.compute().counts, {'a': (1, 1)})
+        data_dictionary['a']['data'] = array('i', [1, 1, 1, 2, 2, 3])
+        self.assertEqual(histogram.compute().counts, {'a': (3, 2)})
+        self.assertNotEqual(histogram.fingerprint(), fingerprint)
+        histogram.data_dictionary = {'a': {'data': [5, 6]}}
+        self.assertEqual(histogram.compute().counts, {'a': (1, 1)})
+
+    def test_histogram_from_mapped_file(self):
+        data = [1, 2, 2, 3, 5, 8, 9]
+        with tempfile.NamedTemporaryFile(delete=False) as column_file:
+            column_file.write(array('d', data).tobytes())
+        self.addCleanup(os.remove, column_file.name)
+        column = load_column(column_file.name)
+        self.assertIsInstance(column, memoryview)
+        expected = Histogram({'a': {'data': data}}).set_columns(['a']).set_breaks(4).compute()
+        histogram = Histogram({'a': {'data': column}}).set_columns(['a']).set_breaks(4)
+        self.assertEqual(histogram.compute().counts, expected.counts)
+        copied = pickle.loads(pickle.dumps(histogram))
+        self.assertEqual(copied.compute().counts, expected.counts)
+        self.assertIs(histogram.data_dictionary['a']['data'], column)
+
+
+class BenchmarksTestCase(SimpleTestCase):
+    def test_case_reports_every_phase(self):
+        case = benchmarks.run_case(1000, breaks=20, columns=2, distribution=benchmarks.DUPLICATES, repeat=1)
+        self.assertEqual(set(case['timings']), set(benchmarks.PHASES))
+        self.assertEqual(set(case['peak_memory']), set(benchmarks.PHASES))
+        self.assertGreater(case['output_bytes'], 0)
+
+    def test_import_time_budget(self):
+        import_time, imported = benchmarks.measure_import('charts.Charts')
+        lazy_modules = [x for x in imported if any(x == y or x.startswith(y + '.') for y in benchmarks.LAZY_MODULES)]
+        self.assertEqual(lazy_modules, [])
+        self.assertLess(import_time, benchmarks.IMPORT_TIME_BUDGET)
+
+
+class LazyImportsTestCase(SimpleTestCase):
+    def test_charts_from_package(self):
+        import charts
+        self.assertIs(charts.Histogram, Histogram)
+        self.assertIn('LineChart', dir(charts))
+        with self.assertRaises(AttributeError):
+            charts.Unknown
+
+    def test_optional_module(self):
+        self.assertIsNone(lazy.optional_module('charts_missing_module'))
+        module = lazy.LazyModule('colorsys')
+        self.assertFalse(module.is_imported)
+        self.assertEqual(module.rgb_to_hsv(0, 0, 0), (0, 0, 0))
+        self.assertTrue(module.is_imported)
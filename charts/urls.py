@@ -1,6 +1,12 @@
 from django.urls import path
 from . import views
+from .cache import DEFAULT_TIMEOUT
 
 urlpatterns = [
-    path('sample-charts/', views.ChartsSampleView.as_view())
+    path('sample-charts/', views.ChartsSampleView.as_view()),
+    path('sample-charts/histogram.svg', views.ChartsSampleSvgView.as_view()),
+    path('sample-charts/async/', views.ChartsSampleAsyncView.as_view()),
+    path('svg/<slug:fingerprint>.svg', views.ChartFragmentSvgView.as_view(), name='simple_charts_svg'),
+    path('svg/live/<slug:fingerprint>.svg',
+         views.ChartFragmentSvgView.as_view(max_age=DEFAULT_TIMEOUT, immutable=False), name='simple_charts_live_svg'),
 ]
\ No newline at end of file
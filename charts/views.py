@@ -1,5 +1,22 @@
-from django.views.generic import TemplateView
-from charts.Charts import Histogram
+import asyncio
+
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import patch_cache_control
+from django.views.generic import TemplateView, View
+from django.views.generic.base import ContextMixin, TemplateResponseMixin
+from charts import fragments
+from charts.Charts import Histogram, LineChart
+
+SAMPLE_DATA = [6621, 3111, 8867, 2788, 3580, 9286, 7640, 3648, 3196, 1482, 8815, 1339, 6773, 2472, 4612, 3452, 8806, 7517, 2327, 8309, 4885, 1663, 7844, 1089, 551, 1966, 2170, 148, 452, 2536, 78, 6859, 2638, 7548, 3820, 4662, 3446, 9713, 819, 7910, 6147, 6724, 4833, 7420, 7131, 4040, 2439, 9086, 5620, 4919, 8883, 3887, 877, 2806, 4451, 4002, 2984, 8163, 9795, 4726, 1657, 5998, 4717, 9197, 2857, 6577, 543, 6360, 7571, 3092, 5766, 4943, 9615, 2140, 2096, 5593, 6677, 9399, 8306, 4521, 6924, 7725, 9191, 7822, 5033, 7087, 575, 6058, 4077, 5248, 8177, 4223, 4884, 9447, 8180, 735, 6376, 8270, 1142, 567, 65, 3276, 2820, 3341, 8481, 9036, 1893, 1898, 512, 5794, 372, 9623, 9359, 3863, 675, 7351, 3191, 86, 1071, 8358, 8892, 4008, 8217, 8982, 5738, 7647, 5163, 7190, 4136, 6090, 3737, 4589, 4819, 495, 9005, 4729, 785, 9270, 2296, 3042, 1545, 9044, 243, 5284, 4020, 5073, 4216, 6232, 8615, 5760, 2293, 2565, 8117, 1127, 2445, 794, 3598, 3275, 2284, 1681, 419, 1295, 6380, 8121, 5861, 8203, 5432, 5031, 4061, 1145, 3646, 2883, 836, 1716, 4414, 5802, 7957, 6751, 2268, 6447, 1421, 6558, 4816, 1994, 4349, 8445, 6839, 4467, 7277, 1430, 9907, 7154, 5614, 9664, 8238, 5897, 5780, 4845, 8136, 8779, 1934, 4492, 1269, 2934, 4371, 2605, 3656, 9570, 5964, 5076, 6674, 1827, 4177, 1710, 1116, 2666, 4118, 950, 4101, 9321, 2773, 7095, 7312, 8486, 682, 5801, 2026, 6840, 2576, 3271, 7699, 7756, 5366, 5530, 133, 3222, 988, 1438, 4570, 8069, 8500, 1941, 4068, 8775, 4435, 7534, 8887, 7875, 4523, 867, 284, 4506, 6044, 5283, 3462, 6721, 2771, 594, 2616, 32, 4809, 5402, 8602, 7014, 5417, 6999, 8524, 8582, 2952, 5070, 1976, 443, 6618, 5607, 7515, 5363, 3953, 7537, 4987, 1281, 1621, 7963, 8641, 2425, 2998, 3016, 6167, 732, 4787, 1817, 9155, 1755, 5092, 7002, 3464, 2430, 1945, 6931, 8801, 9507, 9085, 1150, 5358, 485, 371, 1914, 1330, 9213, 1995, 868, 3072, 9647, 5686, 9176, 2198, 5624, 3159, 1095, 9121, 9433, 744, 2058, 3500, 9051, 5829, 8497, 9717, 9637, 9310, 4304, 9388, 3590, 4302, 6877, 9891, 542, 3383, 6100, 582, 3258, 9596, 2077, 982, 3749, 6466, 4407, 2081, 7378, 3928, 186, 7421, 4689, 3870, 1617, 497, 6362, 1053, 3708, 6295, 2740, 7055, 4680, 8655, 2446, 6018, 1185, 5279, 1464, 5468, 4090, 4847, 1690, 3611, 1272, 2932, 9065, 6411, 1002, 2435, 5276, 9258, 2108, 8674, 5466, 3447, 8299, 2237, 4671, 8859, 300, 7982, 8011, 6715, 178, 5961, 7672, 1556, 2501, 4864, 2931, 8700, 6768, 7666, 3362, 1455, 4836, 2195, 5444, 3024, 2893, 9020, 2302, 163, 8109, 930, 6965, 9968, 7306, 3710, 7690, 6664, 1334, 6705, 9483, 6006, 7681, 4670, 7060, 5495, 1391, 195, 5902, 8192, 2432, 5975, 6946, 3758, 6472, 2882, 6796, 1693, 9513, 6300, 2955, 3853, 7008, 2308, 6457, 8131, 3375, 679, 1675, 2239, 2889, 6081, 9489, 837, 44, 9696, 3865, 4797, 1907, 1790, 158, 6941, 3587, 8862, 6865, 8218, 8417, 580, 4043, 6368, 3832, 1188, 3301, 6589, 7828, 947, 312, 9565, 3459, 6204, 9050, 9136, 8478, 653, 3696, 5135, 3416, 4497, 461, 5867, 3048, 6907, 6614, 4350, 8707, 914, 2683, 3911, 2107, 8296, 5252, 3155, 2106, 4952, 1275, 8100, 8028, 9087, 7409, 2785, 2982, 8800, 5764, 3997, 4843, 5296, 390, 1577, 8080, 8308, 8367, 2415, 1569, 4648, 6328, 7107, 6228, 9589, 1059, 212, 1783, 8289, 6401, 3405, 7172, 9092, 6020, 7851, 8588, 8729, 1611, 7546, 3797, 2822, 1104, 527, 1953, 3204, 1164, 5523, 2046, 4832, 7453, 427, 5229, 202, 8173, 3668, 8226, 9970, 8283, 1481, 5177, 8757, 589, 5672, 5540, 1000, 4659, 1216, 6, 6930, 5, 2881, 8311, 7147, 7275, 6142, 3437, 8989, 6175, 6093, 4338, 772, 9977, 6322, 9540, 3026, 5623, 1161, 6772, 9605, 7334, 7978, 1643, 8872, 2878, 9822, 7917, 200, 8600, 6281, 6494, 7552, 6926, 105, 1843, 5347, 5420, 5082, 8792, 696, 6027, 1247, 374, 5580, 4361, 929, 3915, 8901, 3954, 8704, 4066, 7424, 3148, 5736, 9955, 4839, 11, 8457, 3635, 1971, 6256, 9799, 2205, 2743, 5562, 3166, 8331, 5479, 2975, 9398, 9735, 3261, 6973, 683, 5817, 2212, 6041, 6883, 1797, 5480, 5134, 2117, 2413, 2555, 3970, 1137, 8477, 6837, 8015, 4276, 2043, 8225, 2685, 1530, 3744, 425, 481, 2210, 5409, 2713, 7160, 1460, 6126, 6935, 196, 1459, 3242, 2393, 8580, 5039, 3868, 1736, 4543, 4722, 91, 7393, 8893, 1813, 1193, 2681, 9010, 1533, 5159, 5105, 3955, 7240, 9319, 4303, 5661, 465, 4629, 2406, 4764, 3742, 6560, 1943, 7491, 8506, 3431, 6164, 9718, 7776, 4931, 4939, 4810, 4610, 6770, 5591, 8827, 6317, 6353, 9594, 7395, 3877, 9527, 2751, 2208, 9918, 3051, 613, 3031, 918, 5768, 2587, 3838, 3537, 9040, 7792, 1546, 8195, 2073, 549, 3972, 6301, 9231, 7899, 9835, 8138, 3013, 7416, 3198, 1604, 2234, 666, 3879, 9581, 4604, 6250, 3427, 3274, 2283, 4341, 6951, 716, 3943, 7443, 1851, 4840, 622, 6554, 5375, 1236, 2942, 4069, 2730, 811, 9102, 1026, 8509, 5081, 7833, 3506, 722, 8937, 2176, 7646, 7906, 7840, 899, 3034, 9324, 8258, 9972, 6827, 6241, 1195, 7298, 5392, 9080, 2852, 998, 1708, 9038, 9928, 2151, 8725, 7662, 4854, 9424, 7671, 3227, 3434, 9245, 2567, 4601, 640, 4970, 3402, 6971, 7284, 3041, 7260, 6504, 7858, 9742, 1423, 9015, 181, 4887, 1564, 6352, 632, 7449, 2585, 9400, 504, 1156, 3551, 3456, 290, 2860, 8768, 5408, 3290, 8387, 5099, 3183, 8260, 3279, 4592, 4638, 1501, 6993, 7836, 4805, 4356, 5748, 2559, 3919, 9547, 9054, 9318, 342, 2280, 9394, 1978, 5337, 6130, 3977, 6651, 6121, 8923, 1332, 4913, 1230, 1633, 6912, 874, 100, 3485, 9643, 4135, 8246, 5600, 3615, 9606, 2655, 9778, 8965, 1589, 1891, 3212, 7480, 9046, 2694, 5224, 9741, 619, 6860, 6917, 306, 4439, 3916, 5194, 4963, 763, 5737, 3652, 9221, 7428, 9593, 3534, 70, 7574, 3714, 4239, 2654, 1641, 6644, 6988, 6143, 6332, 834, 8846, 9181, 7177, 7166, 3774, 209, 8074, 8755, 8386, 9850, 4682, 1887, 5407, 9436, 4973, 830, 3992, 8889, 3743, 1834, 1310, 6686, 7234, 1753, 4222, 3931, 8421, 8593, 2070, 6445, 7540, 3179, 4417, 4254, 8720, 4227, 2544, 9856, 9903, 2457, 1246, 1021, 395, 3661, 8489, 1952, 4702, 9681, 2091, 3599, 1067, 386, 6530, 3922, 3460, 5546, 4564, 8919, 4226, 8313, 7353, 4297, 3570, 8023, 7178, 3967, 9833, 8369, 5847, 4603, 4587, 4495]
+
+
+def get_sample_histogram():
+    """
+    Histogram of sample data
+    :return:
+    """
+    data_dictionary = {'col1': {'data': SAMPLE_DATA}}
+    return Histogram(data_dictionary).set_columns(['col1']).set_breaks(10)
 
 
 class ChartsSampleView(TemplateView):
@@ -10,9 +27,87 @@ class ChartsSampleView(TemplateView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data()
-        data_dictionary = {'col1': {'data': [6621, 3111, 8867, 2788, 3580, 9286, 7640, 3648, 3196, 1482, 8815, 1339, 6773, 2472, 4612, 3452, 8806, 7517, 2327, 8309, 4885, 1663, 7844, 1089, 551, 1966, 2170, 148, 452, 2536, 78, 6859, 2638, 7548, 3820, 4662, 3446, 9713, 819, 7910, 6147, 6724, 4833, 7420, 7131, 4040, 2439, 9086, 5620, 4919, 8883, 3887, 877, 2806, 4451, 4002, 2984, 8163, 9795, 4726, 1657, 5998, 4717, 9197, 2857, 6577, 543, 6360, 7571, 3092, 5766, 4943, 9615, 2140, 2096, 5593, 6677, 9399, 8306, 4521, 6924, 7725, 9191, 7822, 5033, 7087, 575, 6058, 4077, 5248, 8177, 4223, 4884, 9447, 8180, 735, 6376, 8270, 1142, 567, 65, 3276, 2820, 3341, 8481, 9036, 1893, 1898, 512, 5794, 372, 9623, 9359, 3863, 675, 7351, 3191, 86, 1071, 8358, 8892, 4008, 8217, 8982, 5738, 7647, 5163, 7190, 4136, 6090, 3737, 4589, 4819, 495, 9005, 4729, 785, 9270, 2296, 3042, 1545, 9044, 243, 5284, 4020, 5073, 4216, 6232, 8615, 5760, 2293, 2565, 8117, 1127, 2445, 794, 3598, 3275, 2284, 1681, 419, 1295, 6380, 8121, 5861, 8203, 5432, 5031, 4061, 1145, 3646, 2883, 836, 1716, 4414, 5802, 7957, 6751, 2268, 6447, 1421, 6558, 4816, 1994, 4349, 8445, 6839, 4467, 7277, 1430, 9907, 7154, 5614, 9664, 8238, 5897, 5780, 4845, 8136, 8779, 1934, 4492, 1269, 2934, 4371, 2605, 3656, 9570, 5964, 5076, 6674, 1827, 4177, 1710, 1116, 2666, 4118, 950, 4101, 9321, 2773, 7095, 7312, 8486, 682, 5801, 2026, 6840, 2576, 3271, 7699, 7756, 5366, 5530, 133, 3222, 988, 1438, 4570, 8069, 8500, 1941, 4068, 8775, 4435, 7534, 8887, 7875, 4523, 867, 284, 4506, 6044, 5283, 3462, 6721, 2771, 594, 2616, 32, 4809, 5402, 8602, 7014, 5417, 6999, 8524, 8582, 2952, 5070, 1976, 443, 6618, 5607, 7515, 5363, 3953, 7537, 4987, 1281, 1621, 7963, 8641, 2425, 2998, 3016, 6167, 732, 4787, 1817, 9155, 1755, 5092, 7002, 3464, 2430, 1945, 6931, 8801, 9507, 9085, 1150, 5358, 485, 371, 1914, 1330, 9213, 1995, 868, 3072, 9647, 5686, 9176, 2198, 5624, 3159, 1095, 9121, 9433, 744, 2058, 3500, 9051, 5829, 8497, 9717, 9637, 9310, 4304, 9388, 3590, 4302, 6877, 9891, 542, 3383, 6100, 582, 3258, 9596, 2077, 982, 3749, 6466, 4407, 2081, 7378, 3928, 186, 7421, 4689, 3870, 1617, 497, 6362, 1053, 3708, 6295, 2740, 7055, 4680, 8655, 2446, 6018, 1185, 5279, 1464, 5468, 4090, 4847, 1690, 3611, 1272, 2932, 9065, 6411, 1002, 2435, 5276, 9258, 2108, 8674, 5466, 3447, 8299, 2237, 4671, 8859, 300, 7982, 8011, 6715, 178, 5961, 7672, 1556, 2501, 4864, 2931, 8700, 6768, 7666, 3362, 1455, 4836, 2195, 5444, 3024, 2893, 9020, 2302, 163, 8109, 930, 6965, 9968, 7306, 3710, 7690, 6664, 1334, 6705, 9483, 6006, 7681, 4670, 7060, 5495, 1391, 195, 5902, 8192, 2432, 5975, 6946, 3758, 6472, 2882, 6796, 1693, 9513, 6300, 2955, 3853, 7008, 2308, 6457, 8131, 3375, 679, 1675, 2239, 2889, 6081, 9489, 837, 44, 9696, 3865, 4797, 1907, 1790, 158, 6941, 3587, 8862, 6865, 8218, 8417, 580, 4043, 6368, 3832, 1188, 3301, 6589, 7828, 947, 312, 9565, 3459, 6204, 9050, 9136, 8478, 653, 3696, 5135, 3416, 4497, 461, 5867, 3048, 6907, 6614, 4350, 8707, 914, 2683, 3911, 2107, 8296, 5252, 3155, 2106, 4952, 1275, 8100, 8028, 9087, 7409, 2785, 2982, 8800, 5764, 3997, 4843, 5296, 390, 1577, 8080, 8308, 8367, 2415, 1569, 4648, 6328, 7107, 6228, 9589, 1059, 212, 1783, 8289, 6401, 3405, 7172, 9092, 6020, 7851, 8588, 8729, 1611, 7546, 3797, 2822, 1104, 527, 1953, 3204, 1164, 5523, 2046, 4832, 7453, 427, 5229, 202, 8173, 3668, 8226, 9970, 8283, 1481, 5177, 8757, 589, 5672, 5540, 1000, 4659, 1216, 6, 6930, 5, 2881, 8311, 7147, 7275, 6142, 3437, 8989, 6175, 6093, 4338, 772, 9977, 6322, 9540, 3026, 5623, 1161, 6772, 9605, 7334, 7978, 1643, 8872, 2878, 9822, 7917, 200, 8600, 6281, 6494, 7552, 6926, 105, 1843, 5347, 5420, 5082, 8792, 696, 6027, 1247, 374, 5580, 4361, 929, 3915, 8901, 3954, 8704, 4066, 7424, 3148, 5736, 9955, 4839, 11, 8457, 3635, 1971, 6256, 9799, 2205, 2743, 5562, 3166, 8331, 5479, 2975, 9398, 9735, 3261, 6973, 683, 5817, 2212, 6041, 6883, 1797, 5480, 5134, 2117, 2413, 2555, 3970, 1137, 8477, 6837, 8015, 4276, 2043, 8225, 2685, 1530, 3744, 425, 481, 2210, 5409, 2713, 7160, 1460, 6126, 6935, 196, 1459, 3242, 2393, 8580, 5039, 3868, 1736, 4543, 4722, 91, 7393, 8893, 1813, 1193, 2681, 9010, 1533, 5159, 5105, 3955, 7240, 9319, 4303, 5661, 465, 4629, 2406, 4764, 3742, 6560, 1943, 7491, 8506, 3431, 6164, 9718, 7776, 4931, 4939, 4810, 4610, 6770, 5591, 8827, 6317, 6353, 9594, 7395, 3877, 9527, 2751, 2208, 9918, 3051, 613, 3031, 918, 5768, 2587, 3838, 3537, 9040, 7792, 1546, 8195, 2073, 549, 3972, 6301, 9231, 7899, 9835, 8138, 3013, 7416, 3198, 1604, 2234, 666, 3879, 9581, 4604, 6250, 3427, 3274, 2283, 4341, 6951, 716, 3943, 7443, 1851, 4840, 622, 6554, 5375, 1236, 2942, 4069, 2730, 811, 9102, 1026, 8509, 5081, 7833, 3506, 722, 8937, 2176, 7646, 7906, 7840, 899, 3034, 9324, 8258, 9972, 6827, 6241, 1195, 7298, 5392, 9080, 2852, 998, 1708, 9038, 9928, 2151, 8725, 7662, 4854, 9424, 7671, 3227, 3434, 9245, 2567, 4601, 640, 4970, 3402, 6971, 7284, 3041, 7260, 6504, 7858, 9742, 1423, 9015, 181, 4887, 1564, 6352, 632, 7449, 2585, 9400, 504, 1156, 3551, 3456, 290, 2860, 8768, 5408, 3290, 8387, 5099, 3183, 8260, 3279, 4592, 4638, 1501, 6993, 7836, 4805, 4356, 5748, 2559, 3919, 9547, 9054, 9318, 342, 2280, 9394, 1978, 5337, 6130, 3977, 6651, 6121, 8923, 1332, 4913, 1230, 1633, 6912, 874, 100, 3485, 9643, 4135, 8246, 5600, 3615, 9606, 2655, 9778, 8965, 1589, 1891, 3212, 7480, 9046, 2694, 5224, 9741, 619, 6860, 6917, 306, 4439, 3916, 5194, 4963, 763, 5737, 3652, 9221, 7428, 9593, 3534, 70, 7574, 3714, 4239, 2654, 1641, 6644, 6988, 6143, 6332, 834, 8846, 9181, 7177, 7166, 3774, 209, 8074, 8755, 8386, 9850, 4682, 1887, 5407, 9436, 4973, 830, 3992, 8889, 3743, 1834, 1310, 6686, 7234, 1753, 4222, 3931, 8421, 8593, 2070, 6445, 7540, 3179, 4417, 4254, 8720, 4227, 2544, 9856, 9903, 2457, 1246, 1021, 395, 3661, 8489, 1952, 4702, 9681, 2091, 3599, 1067, 386, 6530, 3922, 3460, 5546, 4564, 8919, 4226, 8313, 7353, 4297, 3570, 8023, 7178, 3967, 9833, 8369, 5847, 4603, 4587, 4495]}}
-        h = Histogram(data_dictionary).set_columns(['col1']).set_breaks(10)
-        context['histogram'] = h
+        context['histogram'] = get_sample_histogram().set_render_cache()
         return context
 
 
+class ChartSvgView(View):
+    """
+    Serve a chart as an SVG image, streamed fragment by fragment
+    """
+    content_type = 'image/svg+xml'
+
+    def get_chart(self):
+        """
+        Get the chart to serve
+        :return:
+        """
+        raise NotImplementedError
+
+    def get(self, request, *args, **kwargs):
+        return StreamingHttpResponse(self.get_chart().iter_svg(), content_type=self.content_type)
+
+
+class ChartFragmentSvgView(View):
+    """
+    Serve the SVG image of a chart rendered lazily by the {% chart %} template tag.
+    Images are identified by the chart fingerprint, images of charts without live data never change and are cached
+    by browsers, those of charts with live data (ie. a queryset) are cached as long as their fragment.
+    """
+    content_type = 'image/svg+xml'
+    max_age = 365 * 24 * 3600
+    immutable = True
+
+    def get(self, request, fingerprint, *args, **kwargs):
+        markup = fragments.render_stored_chart(fingerprint)
+        if markup is None:
+            raise Http404('Unknown or expired chart')
+        response = HttpResponse(markup, content_type=self.content_type)
+        if self.immutable:
+            patch_cache_control(response, public=True, max_age=self.max_age, immutable=True)
+        else:
+            patch_cache_control(response, public=True, max_age=self.max_age)
+        return response
+
+
+class ChartsSampleSvgView(ChartSvgView):
+    """
+    temporary view for streamed charts usage sample
+    """
+
+    def get_chart(self):
+        return get_sample_histogram()
+
+
+class AsyncChartsView(TemplateResponseMixin, ContextMixin, View):
+    """
+    Render the charts of a page concurrently with Chart.ahtml_svg, for ASGI deployments.
+    Markup of every chart is added to the template context under its name.
+    """
+
+    def get_charts(self):
+        """
+        Get charts to render
+        :return: dictionary of context name to chart
+        """
+        raise NotImplementedError
+
+    async def get(self, request, *args, **kwargs):
+        charts = self.get_charts()
+        markups = await asyncio.gather(*[x.ahtml_svg() for x in charts.values()])
+        context = self.get_context_data(**kwargs)
+        context.update(zip(charts, markups))
+        return self.render_to_response(context)
+
+
+class ChartsSampleAsyncView(AsyncChartsView):
+    """
+    temporary view for async charts usage sample
+    """
+    template_name = 'sample_charts_async.html'
+
+    def get_charts(self):
+        return {
+            'histogram': get_sample_histogram().set_render_cache(),
+            'line_chart': LineChart({'col1': {'data': SAMPLE_DATA}}).set_columns(['col1']),
+        }